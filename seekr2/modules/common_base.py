@@ -10,6 +10,7 @@ import re
 import math
 
 import numpy as np
+from scipy import special
 import parmed
 from parmed import unit
 
@@ -169,6 +170,57 @@ def convert_openmm_to_python_expr(old_function_str):
     new_function_str = re.sub(r"\^", "**", old_function_str)
     return new_function_str
 
+# OpenMM's step, delta, and select functions for scalar arguments
+_STEP = lambda x : 0 if x < 0 else 1
+_DELTA = lambda x : 1 if x == 0 else 0
+_SELECT = lambda x, y, z : z if x == 0 else y
+
+# The same functions, branchless and elementwise, for evaluating a CV
+# expression on arrays
+_STEP_BATCHED = lambda x : np.where(x < 0, 0.0, 1.0)
+_DELTA_BATCHED = lambda x : np.where(x == 0, 1.0, 0.0)
+_SELECT_BATCHED = lambda x, y, z : np.where(x == 0, z, y)
+
+# The functions available to CV expressions, used as the globals when
+# evaluating a (converted) expression for a single set of coordinates.
+CV_EXEC_GLOBALS = {
+    "sqrt": math.sqrt, "exp": math.exp, "log": math.log, "sin": math.sin,
+    "cos": math.cos, "tan": math.tan, "asin": math.asin, "acos": math.acos,
+    "atan": math.atan, "sinh": math.sinh, "cosh": math.cosh,
+    "tanh": math.tanh, "erf": math.erf, "erfc": math.erfc,
+    "floor": math.floor, "ceil": math.ceil,
+    "step": _STEP, "delta": _DELTA, "select": _SELECT}
+
+# The same functions, but operating elementwise on arrays, for evaluating
+# a CV expression over many frames at once.
+CV_EXEC_GLOBALS_BATCHED = {
+    "sqrt": np.sqrt, "exp": np.exp, "log": np.log, "sin": np.sin,
+    "cos": np.cos, "tan": np.tan, "asin": np.arcsin, "acos": np.arccos,
+    "atan": np.arctan, "sinh": np.sinh, "cosh": np.cosh,
+    "tanh": np.tanh, "erf": special.erf, "erfc": special.erfc,
+    "floor": np.floor, "ceil": np.ceil,
+    "step": _STEP_BATCHED, "delta": _DELTA_BATCHED,
+    "select": _SELECT_BATCHED}
+
+# Compiled CV expressions, keyed by the OpenMM expression string, shared
+# between all the CVs that use the same expression.
+_COMPILED_CV_EXPRESSIONS = {}
+
+def compile_cv_expression(cv_expression):
+    """
+    Return the code object that assigns the value of the OpenMM
+    expression cv_expression to the variable 'result', compiling it
+    only the first time a given expression is encountered. The code
+    object is meant to be exec'd with CV_EXEC_GLOBALS or
+    CV_EXEC_GLOBALS_BATCHED as its globals.
+    """
+    code = _COMPILED_CV_EXPRESSIONS.get(cv_expression)
+    if code is None:
+        python_expr = convert_openmm_to_python_expr("result="+cv_expression)
+        code = compile(python_expr, "<cv_expression>", "exec")
+        _COMPILED_CV_EXPRESSIONS[cv_expression] = code
+    return code
+
 class Box_vectors(Serializer):
     """
     A box vector object that contains the a, b, and c vectors in units
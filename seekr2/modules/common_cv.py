@@ -5,6 +5,7 @@ Define collective variable superclasses (also known as milestone
 shapes) that might be used in SEEKR2 calculations.
 """
 
+import math
 from abc import abstractmethod
 from collections import defaultdict
 
@@ -495,9 +496,20 @@ class Tiwary_cv_distance_order_parameter(Serializer):
         
         """
         assert len(coms) == 2
-        distance = np.linalg.norm(coms[1]-coms[0])
+        dx, dy, dz = coms[1]-coms[0]
+        distance = math.sqrt(dx*dx + dy*dy + dz*dz)
         return distance
     
+    def get_value_array(self, coms):
+        """
+        Compute the order parameter for many frames at once. The coms
+        argument has the shape (2, n_frames, 3), and an array of
+        n_frames values is returned.
+        """
+        assert len(coms) == 2
+        distances = np.linalg.norm(coms[1]-coms[0], axis=1)
+        return distances
+    
 class Tiwary_cv_angle_order_parameter(Serializer):
     """
     An order parameter object for a Tiwary CV the represents the
@@ -557,6 +569,20 @@ class Tiwary_cv_angle_order_parameter(Serializer):
                                  vec2/np.linalg.norm(vec2)))
         return angle
     
+    def get_value_array(self, coms):
+        """
+        Compute the order parameter for many frames at once. The coms
+        argument has the shape (3, n_frames, 3), and an array of
+        n_frames values is returned.
+        """
+        assert len(coms) == 3
+        vec1 = coms[0] - coms[1]
+        vec2 = coms[2] - coms[1]
+        vec1 /= np.linalg.norm(vec1, axis=1)[:,np.newaxis]
+        vec2 /= np.linalg.norm(vec2, axis=1)[:,np.newaxis]
+        angles = np.arccos(np.einsum("ij,ij->i", vec1, vec2))
+        return angles
+    
 class Tiwary_cv_torsion_order_parameter(Serializer):
     """
     An order parameter object for a Tiwary CV the represents the
@@ -605,10 +631,6 @@ class Tiwary_cv_torsion_order_parameter(Serializer):
         
         """
         assert len(coms) == 4
-        new_coms = []
-        for com in coms:
-            new_coms.append(com)
-        coms = new_coms
         x1 = coms[0][0]; y1 = coms[0][1]; z1 = coms[0][2]
         x2 = coms[1][0]; y2 = coms[1][1]; z2 = coms[1][2]
         x3 = coms[2][0]; y3 = coms[2][1]; z3 = coms[2][2]
@@ -628,6 +650,28 @@ class Tiwary_cv_torsion_order_parameter(Serializer):
         while phi < (-np.pi):
             phi += 2.0*np.pi
         return phi
+    
+    def get_value_array(self, coms):
+        """
+        Compute the order parameter for many frames at once. The coms
+        argument has the shape (4, n_frames, 3), and an array of
+        n_frames values is returned.
+        """
+        assert len(coms) == 4
+        vec1 = coms[1] - coms[0]
+        axis = coms[2] - coms[1]
+        vec2 = coms[3] - coms[2]
+        cross1 = np.cross(vec1, axis)
+        cross2 = np.cross(axis, vec2)
+        cross1 /= np.linalg.norm(cross1, axis=1)[:,np.newaxis]
+        cross2 /= np.linalg.norm(cross2, axis=1)[:,np.newaxis]
+        axis /= np.linalg.norm(axis, axis=1)[:,np.newaxis]
+        x = np.einsum("ij,ij->i", cross1, cross2)
+        y = np.einsum("ij,ij->i", np.cross(cross1, axis), cross2)
+        # After the modulo, phi lies within [0, 2*pi)
+        phi = -np.arctan2(y, x) % (2.0*np.pi)
+        phi[phi > np.pi] -= 2.0*np.pi
+        return phi
 
 class Tiwary_cv_input(CV_input):
     """
@@ -13,6 +13,7 @@ import re
 import glob
 import shutil
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 
@@ -656,6 +657,10 @@ def resolve_connections(connection_flag_dict, model, associated_input_anchor,
             for milestone_to_remove in sorted(milestones_to_remove, reverse=True):
                 anchors[new_index].milestones.pop(milestone_to_remove)
             
+            if model.get_type() == "mmvt":
+                # The milestones were renumbered in place
+                anchors[new_index]._invalidate_milestone_maps()
+            
         visited_new_indices.append(new_index)
             
     xml_path = os.path.join(root_directory, "model.xml")
@@ -669,6 +674,7 @@ def resolve_connections(connection_flag_dict, model, associated_input_anchor,
     else:
         new_anchors_with_starting_pdbs_to_keep = None
     
+    building_file_copies = []
     for old_index in index_reference:
         new_index = index_reference[old_index]
         if new_index < len(anchors):
@@ -679,8 +685,18 @@ def resolve_connections(connection_flag_dict, model, associated_input_anchor,
                     and (new_index in new_anchors_with_starting_pdbs_to_keep):
                 print("Keeping starting structure for anchor:", new_index)
             else:
-                filetree.copy_building_files_by_anchor(
-                    anchors[new_index], input_anchor, root_directory)
+                building_file_copies.append(
+                    (anchors[new_index], input_anchor))
+    
+    # Each anchor's building files go into its own directory, so the
+    # copies (mostly waiting on the filesystem) can overlap.
+    with ThreadPoolExecutor() as executor:
+        futures = [executor.submit(filetree.copy_building_files_by_anchor,
+                                   anchor, input_anchor, root_directory) \
+                   for anchor, input_anchor in building_file_copies]
+        for future in futures:
+            # Raise any error from the copies, in anchor order
+            future.result()
                                 
     return anchors
 
@@ -1056,15 +1072,11 @@ def modify_model(old_model, new_model, root_directory, force_overwrite=False):
         if not alpha_paired:
             new_anchors_to_create.append(alpha)
         
+    paired_betas = set(pair[1] for pair in anchor_pairs)
     for beta, anchor2 in enumerate(old_model.anchors):
         if anchor2.bulkstate:
             continue
-        beta_paired = False
-        for pair in anchor_pairs:
-            if beta == pair[1]:
-                beta_paired = True
-                break
-        if not beta_paired:
+        if beta not in paired_betas:
             old_anchors_to_delete.append(beta)
         
     # Now check all the paired anchors to see if anyone's milestones
@@ -1086,13 +1098,10 @@ def modify_model(old_model, new_model, root_directory, force_overwrite=False):
                     break
             if not milestone1_paired:
                 milestones_changed = True
+        paired_js = set(milestone_pair[1] for milestone_pair \
+                        in milestone_pairs)
         for j, milestone2 in enumerate(anchor2.milestones):
-            milestone2_paired = False
-            for milestone_pair in milestone_pairs:
-                if j == milestone_pair[1]:
-                    milestone2_paired = True
-                    break
-            if not milestone2_paired:
+            if j not in paired_js:
                 milestones_changed = True
         if milestones_changed:
             old_anchors_with_changed_milestones.append(beta)
@@ -886,30 +886,21 @@ def add_ghost_atom_to_pqr_from_atoms_center_of_mass(
         new_pqr_filename = pqr_filename
     pqr_struct = parmed.load_file(pqr_filename, skip_bonds=True)
     
+    coordinates = pqr_struct.coordinates
+    atom_masses = np.array([atom.mass for atom in pqr_struct.atoms])
+    atom_masses[atom_masses == 0.0] = 0.0001
+    
     # Compute the center of mass for the selected group of atoms
-    center_of_mass = np.array([[0., 0., 0.]])
-    total_mass = 0.0
-    for atom_index in atom_index_list:
-        atom_pos = pqr_struct.coordinates[atom_index,:]
-        atom_mass = pqr_struct.atoms[atom_index].mass
-        if atom_mass == 0.0:
-            atom_mass = 0.0001
-        center_of_mass += atom_mass * atom_pos
-        total_mass += atom_mass
-    center_of_mass = center_of_mass / total_mass
+    atom_indices = np.asarray(atom_index_list, dtype=int)
+    selected_masses = atom_masses[atom_indices]
+    center_of_mass = (selected_masses[:,np.newaxis] \
+        * coordinates[atom_indices,:]).sum(axis=0, keepdims=True) \
+        / selected_masses.sum()
     
     if center_molecule:
         # Compute the center of mass of the entire molecule to be transposed
-        mol_center_of_mass = np.array([[0., 0., 0.]])
-        mol_total_mass = 0.0
-        for atom_index, atom in enumerate(pqr_struct.atoms):
-            atom_pos = pqr_struct.coordinates[atom_index,:]
-            atom_mass = atom.mass
-            if atom_mass == 0.0:
-                atom_mass = 0.0001
-            mol_center_of_mass += atom_mass * atom_pos
-            mol_total_mass += atom_mass
-        mol_center_of_mass = mol_center_of_mass / mol_total_mass
+        mol_center_of_mass = (atom_masses[:,np.newaxis] * coordinates).sum(
+            axis=0, keepdims=True) / atom_masses.sum()
     
     ghost_atom = parmed.Atom(name="GHO", mass=0.0, charge=0.0, solvent_radius=0.0)
     ghost_structure = parmed.Structure()
@@ -920,12 +911,8 @@ def add_ghost_atom_to_pqr_from_atoms_center_of_mass(
         residue.chain = ""
     
     if center_molecule:
-        new_coordinates = np.zeros(pqr_complex.coordinates.shape)
-        for atom_index in range(len(pqr_complex.atoms)):
-            new_coordinates[atom_index,:] = pqr_complex.coordinates[atom_index,:] \
-                - mol_center_of_mass[0,:]
-                
-        pqr_complex.coordinates = new_coordinates
+        pqr_complex.coordinates = pqr_complex.coordinates \
+            - mol_center_of_mass[0,:]
     
     pqr_complex.save(new_pqr_filename, overwrite=True)
     ghost_index = len(pqr_complex.atoms)
@@ -7,7 +7,8 @@ Elber calculations.
 
 from abserdes import Serializer
 
-from seekr2.modules.mmvt_cvs.mmvt_cv_base import traj_center_of_mass
+from seekr2.modules.mmvt_cvs.mmvt_cv_base import traj_center_of_mass, \
+    traj_group_center_of_mass, com_distance_residuals
 
 OPENMM_ELBER_BASENAME = "forward"
 OPENMM_ELBER_EXTENSION = "out"
@@ -148,7 +149,7 @@ class Elber_collective_variable(Serializer):
         raise Exception("This base class cannot be used for creating a "\
                         "collective variable boundary definition.")
 
-class Elber_anchor(Serializer):
+class Elber_anchor(Serializer, blacklist=["_milestone_maps"]):
     """
     An anchor object for representing a Voronoi cell in an Elber 
     milestoning calculation.
@@ -231,25 +232,52 @@ class Elber_anchor(Serializer):
         self.bulkstate = False
         self.milestones = []
         self.variables = {}
+        self._milestone_maps = None
         return
     
+    def _invalidate_milestone_maps(self):
+        """
+        Discard the cached milestone dictionaries. Must be called if
+        any milestone in self.milestones is modified in place.
+        """
+        self._milestone_maps = None
+        return
+    
+    def _get_milestone_map(self, key_attr, value_attr):
+        """
+        Return a dictionary that maps the key_attr of each milestone to
+        its value_attr. Each dictionary is only built the first time it
+        is requested, and is cached until the milestone list has been
+        replaced or has changed length.
+        """
+        # Deserialized anchors are created without calling __init__
+        milestone_maps = getattr(self, "_milestone_maps", None)
+        milestones_key = (id(self.milestones), len(self.milestones))
+        if milestone_maps is None or milestone_maps[0] != milestones_key:
+            milestone_maps = (milestones_key, {})
+            self._milestone_maps = milestone_maps
+        
+        maps = milestone_maps[1]
+        milestone_map = maps.get((key_attr, value_attr))
+        if milestone_map is None:
+            milestone_map = {}
+            for milestone in self.milestones:
+                milestone_map[getattr(milestone, key_attr)] \
+                    = getattr(milestone, value_attr)
+            maps[(key_attr, value_attr)] = milestone_map
+        return milestone_map
+    
     def _make_milestone_collection(self):
         """
         Make the dictionaries that allow for easy access of milestone
         indices, aliases, and neighboring indices.
         """
-        id_key_alias_value_dict = {}
-        alias_key_id_value_dict = {}
-        neighbor_id_key_alias_value_dict = {}
-        
-        for milestone in self.milestones:
-                index = milestone.index
-                neighbor_index = milestone.neighbor_anchor_index
-                alias_index = milestone.alias_index
-                id_key_alias_value_dict[index] = alias_index
-                neighbor_id_key_alias_value_dict[neighbor_index] = alias_index
-                alias_key_id_value_dict[alias_index] = index
-        
+        id_key_alias_value_dict = self._get_milestone_map(
+            "index", "alias_index")
+        alias_key_id_value_dict = self._get_milestone_map(
+            "alias_index", "index")
+        neighbor_id_key_alias_value_dict = self._get_milestone_map(
+            "neighbor_anchor_index", "alias_index")
         return id_key_alias_value_dict, alias_key_id_value_dict, \
             neighbor_id_key_alias_value_dict
     
@@ -258,46 +286,30 @@ class Elber_anchor(Serializer):
         Accept the alias index of a milestone and return the model-wide
         index.
         """
-        id_key_alias_value_dict, alias_key_id_value_dict, \
-            neighbor_id_key_alias_value_dict = self._make_milestone_collection()
-        if alias_id in alias_key_id_value_dict:
-            return alias_key_id_value_dict[alias_id]
-        else:
-            return None
+        return self._get_milestone_map("alias_index", "index").get(alias_id)
     
     def alias_from_id(self, my_id):
         """
         Accept the model-wide index and return the milestone's alias
         index.
         """
-        id_key_alias_value_dict, alias_key_id_value_dict, \
-            neighbor_id_key_alias_value_dict = self._make_milestone_collection()
-        if my_id in id_key_alias_value_dict:
-            return id_key_alias_value_dict[my_id]
-        else:
-            return None
+        return self._get_milestone_map("index", "alias_index").get(my_id)
         
     def alias_from_neighbor_id(self, neighbor_id):
         """
         Take the index of the neighbor anchor's index and provide the
         milestone's alias index.
         """
-        id_key_alias_value_dict, alias_key_id_value_dict, \
-            neighbor_id_key_alias_value_dict = self._make_milestone_collection()
-        if neighbor_id in neighbor_id_key_alias_value_dict:
-            return neighbor_id_key_alias_value_dict[neighbor_id]
-        else:
-            return None
+        return self._get_milestone_map(
+            "neighbor_anchor_index", "alias_index").get(neighbor_id)
         
     def get_ids(self):
         """
         Return a list of model-wide incides.
         """
-        id_key_alias_value_dict, alias_key_id_value_dict, \
-            neighbor_id_key_alias_value_dict = self._make_milestone_collection()
-        return id_key_alias_value_dict.keys()
+        return self._get_milestone_map("index", "alias_index").keys()
     
-class Elber_toy_anchor(Elber_anchor):
+class Elber_toy_anchor(Elber_anchor, blacklist=["_milestone_maps"]):
     """
     An anchor object for representing a Voronoi cell in an Elber 
     milestoning within a toy system.
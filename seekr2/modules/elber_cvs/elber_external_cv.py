@@ -7,15 +7,22 @@ import numpy as np
 
 from parmed import unit
 
+try:
+    import openmm
+except ImportError:
+    import simtk.openmm as openmm
+
 import seekr2.modules.common_base as base
 import seekr2.modules.elber_cvs.elber_cv_base as elber_cv_base
 from seekr2.modules.elber_cvs.elber_cv_base import Elber_collective_variable
 
+_OPENMM_NM = openmm.unit.nanometer
+
 class Elber_external_CV(Elber_collective_variable):
     """
     A collective variable that depends on external coordinates.
     
-    """+Elber_collective_variable.__doc__
+    """
     
     def __init__(self, index, groups):
         self.index = index
@@ -39,10 +46,6 @@ class Elber_external_CV(Elber_collective_variable):
         Make an umbrella sampling force object, which will constrain
         the system to the milestone.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
         return openmm.CustomCentroidBondForce(
             self.num_groups, self.openmm_umbrella_expression)
         
@@ -51,11 +54,6 @@ class Elber_external_CV(Elber_collective_variable):
         Make a list of reversal force objects, which will  be used to
         monitor milestone crossing during the reversal stage.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         return openmm.CustomCentroidBondForce(
             self.num_groups, self.openmm_fwd_rev_expression)
         
@@ -128,13 +126,9 @@ class Elber_external_CV(Elber_collective_variable):
         so they can be provided to the custom force object.
         """
         assert milestone.cv_index == self.index
-        values_list = []
         #bitcode = 2**(milestone.alias_index-1)
-        #values_list.append(bitcode)
-        k_val = milestone.variables["k"]
-        values_list.append(k_val)
-        value_val = milestone.variables["value"]
-        values_list.append(value_val)
+        variables = milestone.variables
+        values_list = [variables["k"], variables["value"]]
         return values_list
     
     def get_namd_evaluation_string(self, milestone, cv_val_var="cv_val"):
@@ -169,58 +163,67 @@ class Elber_external_CV(Elber_collective_variable):
     
     def check_positions_within_boundary(
             self, positions, milestone_variables):
-        sqrt = math.sqrt
-        exp = math.exp
-        log = math.log
-        sin = math.sin
-        cos = math.cos
-        tan = math.tan
-        asin = math.asin
-        acos = math.acos
-        atan = math.atan
-        sinh = math.sinh
-        cosh = math.cosh
-        tanh = math.tanh
-        erf = math.erf
-        erfc = math.erfc
-        floor = math.floor
-        ceil = math.ceil
-        step = lambda x : 0 if x < 0 else 1
-        delta = lambda x : 1 if x == 0 else 0
-        select = lambda x, y, z : z if x == 0 else y
-        expr = ""
-        for i, position in enumerate(positions):
-            expr_x = "x{} = {};".format(i+1, position[0].value_in_unit(
-                openmm.unit.nanometer))
-            expr_y = "y{} = {};".format(i+1, position[1].value_in_unit(
-                openmm.unit.nanometer))
-            expr_z = "z{} = {};".format(i+1, position[2].value_in_unit(
-                openmm.unit.nanometer))
-            expr += expr_x + expr_y + expr_z
-            
-        for variable in milestone_variables:
-            expr_var = "{}={};".format(variable, milestone_variables[variable])
-            expr += expr_var
+        """
+        Evaluate the CV expression for the given positions. Returns
+        True if the result is less than or equal to zero.
+        """
+        positions_nm = np.asarray(positions.value_in_unit(_OPENMM_NM))
+        return self._check_positions_nm_within_boundary(
+            positions_nm, milestone_variables)
+    
+    def _check_positions_nm_within_boundary(
+            self, positions_nm, milestone_variables):
+        """
+        Evaluate the CV expression for unitless positions, given as an
+        (n_atoms, 3) array in nanometers.
+        """
+        namespace = {}
+        for i, position in enumerate(positions_nm):
+            namespace["x{}".format(i+1)] = position[0]
+            namespace["y{}".format(i+1)] = position[1]
+            namespace["z{}".format(i+1)] = position[2]
         
-        #expr += base.convert_openmm_to_python_expr(
-        #    "result="+self.openmm_fwd_rev_expression)
-        expr += base.convert_openmm_to_python_expr(
-            "result="+self.cv_expression)
-        mylocals = locals()
-        exec(expr, globals(), mylocals)
-        result = mylocals["result"]
+        namespace.update(milestone_variables)
+        exec(base.compile_cv_expression(self.cv_expression),
+             base.CV_EXEC_GLOBALS, namespace)
+        result = namespace["result"]
         if result <= 0:
             return True
         else:
             return False
     
+    def check_positions_within_boundary_batched(
+            self, positions_batch, milestone_variables):
+        """
+        Evaluate the CV expression for a whole stack of positions, of
+        shape (n_frames, n_atoms, 3) in nanometers, in a single pass.
+        Returns a boolean array of length n_frames which is True for
+        the frames where the result is less than or equal to zero.
+        """
+        namespace = {}
+        positions_batch = np.asarray(positions_batch)
+        assert positions_batch.ndim == 3, \
+            "positions_batch must have the shape (n_frames, n_atoms, 3)."
+        n_frames, n_atoms, _ = positions_batch.shape
+        for i in range(n_atoms):
+            namespace["x{}".format(i+1)] = positions_batch[:,i,0]
+            namespace["y{}".format(i+1)] = positions_batch[:,i,1]
+            namespace["z{}".format(i+1)] = positions_batch[:,i,2]
+        
+        namespace.update(milestone_variables)
+        exec(base.compile_cv_expression(self.cv_expression),
+             base.CV_EXEC_GLOBALS_BATCHED, namespace)
+        result = np.broadcast_to(namespace["result"], (n_frames,))
+        return result <= 0
+    
     def check_value_within_boundary(self, positions, milestone_variables, 
                                     verbose=False, tolerance=0.0):
         """
         
         """
-        result = self.check_positions_within_boundary(
-            positions*openmm.unit.nanometer, milestone_variables)
+        # The positions are already in nm, so skip the Quantity round-trip
+        result = self._check_positions_nm_within_boundary(
+            np.asarray(positions), milestone_variables)
         return result
     
     def check_mdtraj_close_to_boundary(self, traj, milestone_variables, 
@@ -268,6 +271,9 @@ def make_elber_external_cv_object(external_cv_input, index):
     else:
         cv.openmm_umbrella_expression = external_cv_input.restraining_expression
     
+    # Compile the CV expression now, so that a malformed expression fails
+    # while the model is prepared, and the boundary checks find it ready.
+    base.compile_cv_expression(cv.cv_expression)
     return cv
     
 def make_elber_milestoning_objects_external(
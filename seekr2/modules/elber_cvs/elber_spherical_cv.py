@@ -5,18 +5,26 @@ Structures, methods, and functions for handling Spherical CVs.
 
 import numpy as np
 
-from parmed import unit
+try:
+    import openmm
+except ImportError:
+    import simtk.openmm as openmm
 
 import seekr2.modules.common_base as base
 import seekr2.modules.elber_cvs.elber_cv_base as elber_cv_base
 from seekr2.modules.elber_cvs.elber_cv_base import Elber_collective_variable
 
-class Elber_spherical_CV(Elber_collective_variable):
+# Conversion factor from OpenMM's nanometers to NAMD's Angstroms
+NM_TO_ANGSTROMS = 10.0
+
+class Elber_spherical_CV(
+        Elber_collective_variable,
+        blacklist=["_group_indices", "_namd_colvar_umbrella_string"]):
     """
     A spherical collective variable represents the distance between two
     different groups of atoms.
     
-    """+Elber_collective_variable.__doc__
+    """
     
     def __init__(self, index, groups):
         self.index = index
@@ -31,21 +39,31 @@ class Elber_spherical_CV(Elber_collective_variable):
         self.global_variables = []
         self._mygroup_list = None
         self.variable_name = "r"
+        self._group_indices = None
+        self._namd_colvar_umbrella_string = None
         return
 
     def __name__(self):
         return "Elber_spherical_CV"
     
+    def _get_group_indices(self):
+        """
+        Return the two atom groups as cached int32 index arrays. The
+        groups themselves stay lists so that they serialize as before.
+        """
+        # Deserialized CVs are created without calling __init__
+        group_indices = getattr(self, "_group_indices", None)
+        if group_indices is None:
+            group_indices = (np.asarray(self.group1, dtype=np.int32),
+                             np.asarray(self.group2, dtype=np.int32))
+            self._group_indices = group_indices
+        return group_indices
+    
     def make_umbrella_force_object(self):
         """
         Make an umbrella sampling force object, which will constrain
         the system to the milestone.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         assert self.num_groups == 2
         return openmm.CustomCentroidBondForce(
             self.num_groups, self.openmm_umbrella_expression)
@@ -55,11 +73,6 @@ class Elber_spherical_CV(Elber_collective_variable):
         Make a list of reversal force objects, which will  be used to
         monitor milestone crossing during the reversal stage.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         assert self.num_groups == 2
         return openmm.CustomCentroidBondForce(
             self.num_groups, self.openmm_fwd_rev_expression)
@@ -70,10 +83,15 @@ class Elber_spherical_CV(Elber_collective_variable):
         an umbrella sampling force to constrain the system to the
         milestone.
         """
-        serial_group1 = [str(index+1) for index in self.group1]
-        serial_group2 = [str(index+1) for index in self.group2]
-        serial_group1_str = " ".join(serial_group1)
-        serial_group2_str = " ".join(serial_group2)
+        # The groups don't change once the CV is made, so the string is
+        # only built the first time it is requested.
+        namd_colvar_string = getattr(
+            self, "_namd_colvar_umbrella_string", None)
+        if namd_colvar_string is not None:
+            return namd_colvar_string
+        group1_indices, group2_indices = self._get_group_indices()
+        serial_group1_str = " ".join((group1_indices+1).astype(str))
+        serial_group2_str = " ".join((group2_indices+1).astype(str))
         namd_colvar_string = """
 colvar {{
   name collective_variable_{0}
@@ -84,6 +102,7 @@ colvar {{
   }}
 }}
 """.format(self.index, serial_group1_str, serial_group2_str)
+        self._namd_colvar_umbrella_string = namd_colvar_string
         return namd_colvar_string
         
     def add_fwd_rev_parameters(self, force):
@@ -142,18 +161,23 @@ colvar {{
         force.addBond(group_list, variables)
         return
     
+    def _resolve_milestone(self, milestone):
+        """
+        Return the (k, radius) pair of one of this CV's milestones, in
+        OpenMM's default units (kJ/mol and nm).
+        """
+        assert milestone.cv_index == self.index
+        variables = milestone.variables
+        return variables['k'], variables['radius']
+    
     def get_variable_values_list(self, milestone):
         """
         Create the list of CV variables' values in the proper order
-        so they can be provided to the custom force object.
+        so they can be provided to the custom force object. The values
+        are already in OpenMM's default units (kJ/mol and nm), so they
+        are passed as plain floats rather than Quantity objects.
         """
-        assert milestone.cv_index == self.index
-        values_list = []
-        k = milestone.variables['k'] * unit.kilojoules_per_mole
-        radius = milestone.variables['radius'] * unit.nanometers
-        values_list.append(k)
-        values_list.append(radius)
-        
+        values_list = list(self._resolve_milestone(milestone))
         return values_list
     
     def get_namd_fwd_rev_evaluation_string(self, milestone, cv_val_var="cv_val"):
@@ -163,10 +187,8 @@ colvar {{
         function defined by the string ever returns True, then a
         bounce will occur
         """
-        assert milestone.cv_index == self.index
-        k = milestone.variables['k']
-        radius_in_nm = milestone.variables['radius'] * unit.nanometers
-        radius_in_A = radius_in_nm.value_in_unit(unit.angstroms)
+        k, radius = self._resolve_milestone(milestone)
+        radius_in_A = radius * NM_TO_ANGSTROMS
         eval_string = "{0} * (${1}_{2} - {3}) > 0".format(
             k, cv_val_var, self.index, radius_in_A)
         return eval_string
@@ -176,22 +198,17 @@ colvar {{
         """
         
         """
-        traj1 = traj.atom_slice(self.group1)
-        traj2 = traj.atom_slice(self.group2)
-        com1_array = elber_cv_base.traj_center_of_mass(traj1)
-        com2_array = elber_cv_base.traj_center_of_mass(traj2)
+        group1_indices, group2_indices = self._get_group_indices()
+        com1_array = elber_cv_base.traj_group_center_of_mass(
+            traj, group1_indices)
+        com2_array = elber_cv_base.traj_group_center_of_mass(
+            traj, group2_indices)
         #com1_array = mdtraj.compute_center_of_mass(traj1)
         #com2_array = mdtraj.compute_center_of_mass(traj2)
-        distances = []
-        for frame_index in range(traj.n_frames):
-            com1 = com1_array[frame_index,:]
-            com2 = com2_array[frame_index,:]
-            radius = np.linalg.norm(com2-com1)
-            milestone_radius = milestone_variables["radius"]
-            distances.append(radius - milestone_radius)
-            
-        avg_distance = np.mean(distances)
-        std_distance = np.std(distances)
+        distances = elber_cv_base.com_distance_residuals(
+            com1_array, com2_array, milestone_variables["radius"])
+        avg_distance = float(distances.mean())
+        std_distance = float(distances.std())
         if abs(avg_distance) > max_avg or std_distance > max_std:
             if verbose:
                 warnstr = """The distance between the system and central 
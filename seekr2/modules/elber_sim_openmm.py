@@ -299,6 +299,12 @@ def make_elber_boundary_definitions(cv, milestone):
     return an OpenMM Force() object that the plugin can use to monitor
     crossings.
     
+    The force is placed in its own force group, numbered by the
+    milestone's alias_index, while all other forces of the system are
+    kept in group 0. The boundary can therefore be evaluated on its
+    own with context.getState(getEnergy=True, groups={alias_index}),
+    without recomputing the energy of the rest of the system.
+    
     Parameters
     ----------
     cv : Collective_variable()
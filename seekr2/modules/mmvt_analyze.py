@@ -432,10 +432,7 @@ def namd_read_output_file_list(output_file_list, anchor, timestep,
         current_stepnum = int(line[8].strip(","))
                 
         dest_time = current_stepnum * timestep
-        dest_boundary = None
-        for milestone in anchor.milestones:
-            if milestone.neighbor_anchor_index == next_anchor_raw:
-                dest_boundary = milestone.alias_index
+        dest_boundary = anchor.alias_from_neighbor_id(next_anchor_raw)
                 
         # This is used to cut out early transitions for analysis
         if min_time is not None:
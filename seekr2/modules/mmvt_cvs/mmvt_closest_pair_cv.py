@@ -2,10 +2,18 @@
 Structures, methods, and functions for handling closest-pair CVs.
 """
 
+import math
+
 import numpy as np
+from scipy.spatial import cKDTree
 
 from parmed import unit
 
+try:
+    import openmm
+except ImportError:
+    import simtk.openmm as openmm
+
 import seekr2.modules.common_base as base
 import seekr2.modules.mmvt_cvs.mmvt_cv_base as mmvt_cv_base
 from seekr2.modules.mmvt_cvs.mmvt_cv_base import MMVT_collective_variable
@@ -15,7 +23,7 @@ class MMVT_closest_pair_CV(MMVT_collective_variable):
     A collective variable represents the closest distance between a pair
     of atoms out of two sets of atoms.
     
-    """+MMVT_collective_variable.__doc__
+    """
     
     def __init__(self, index, groups):
         self.index = index
@@ -54,11 +62,6 @@ class MMVT_closest_pair_CV(MMVT_collective_variable):
         refer to them as forces outside of this layer of the code,
         preferring instead the term: boundary definitions.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         assert self.num_groups == 2
         self.openmm_expression \
             = "step(k_{}*((closest + (1/{})^exponent)^(-1.0/exponent) - value_{}))".format(
@@ -75,11 +78,6 @@ class MMVT_closest_pair_CV(MMVT_collective_variable):
         """
         raise Exception("Restraining force not available for Closest pair CV.")
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         assert self.num_groups == 2
         self.restraining_expression \
             = "0.5*k_{}*((closest + (1/{})^exponent)^(-1.0/exponent) - value_{})^2"\
@@ -95,11 +93,6 @@ class MMVT_closest_pair_CV(MMVT_collective_variable):
         """
         
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         #pdb_file = openmm_app.PDBFile(self.ref_structure)
         #rmsd_me_force = openmm.RMSDForce(pdb_file.positions, self.group)
         #rmsd_neighbor_force = openmm.RMSDForce(pdb_file.positions, self.group)
@@ -179,11 +172,6 @@ class MMVT_closest_pair_CV(MMVT_collective_variable):
         variable_names_list. The numerical values of these variables
         will be provided at a later step.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         closest_force = openmm.CustomNonbondedForce("(1/r)^exponent")
         closest_force.addGlobalParameter("exponent", self.exponent)
         closest_force.addInteractionGroup(self.group1, self.group2)
@@ -234,9 +222,9 @@ class MMVT_closest_pair_CV(MMVT_collective_variable):
         """
         assert milestone.cv_index == self.index
         values_list = []
-        bitcode = 2**(milestone.alias_index-1)
-        k = milestone.variables["k"] * unit.kilojoules_per_mole/unit.angstrom**2
-        value = milestone.variables["value"] * unit.nanometers
+        bitcode = mmvt_cv_base.get_bitcode(milestone.alias_index)
+        k = milestone.variables["k"] * mmvt_cv_base.K_UNIT
+        value = milestone.variables["value"] * mmvt_cv_base.VALUE_UNIT
         values_list.append(bitcode)
         values_list.append(k)
         values_list.append(value)
@@ -251,6 +239,23 @@ class MMVT_closest_pair_CV(MMVT_collective_variable):
         """
         raise Exception("MMVT Closest pair CVs are not available in NAMD")
     
+    def _get_frame_cv_value(self, frame_xyz):
+        """
+        Compute the smoothed closest-pair distance for one frame of
+        positions (in nm). Only the pairs within the cutoff contribute
+        to the sum, so a KD-tree is used to find them instead of
+        visiting every possible pair of atoms.
+        """
+        tree1 = cKDTree(frame_xyz[self.group1,:])
+        tree2 = cKDTree(frame_xyz[self.group2,:])
+        pairs = tree1.sparse_distance_matrix(
+            tree2, self.cutoff_distance, output_type="ndarray")
+        dists = pairs["v"][pairs["v"] < self.cutoff_distance]
+        sum = (1.0 / self.cutoff_distance) ** self.exponent \
+            + np.sum((1.0/dists) ** self.exponent)
+        min_value = sum ** (-1.0/self.exponent)
+        return min_value
+    
     def get_mdtraj_cv_value(self, traj, frame_index):
         """
         Determine the current CV value for an mdtraj object.
@@ -261,17 +266,7 @@ class MMVT_closest_pair_CV(MMVT_collective_variable):
         #for index in self.group2:
         #    atom_set_list.append(set([traj.topology.atom(index)]))
         traj.image_molecules(inplace=True, anchor_molecules=atom_set_list)
-        sum = (1.0 / self.cutoff_distance) ** self.exponent
-        for atom_index1 in self.group1:
-            for atom_index2 in self.group2:
-                com1 = traj.xyz[frame_index, atom_index1,:]
-                com2 = traj.xyz[frame_index, atom_index2,:]
-                dist = np.linalg.norm(com2-com1)
-                if dist < self.cutoff_distance:
-                    sum += (1.0/dist) ** self.exponent
-                
-        min_value = sum ** (-1.0/self.exponent)
-        return min_value
+        return self._get_frame_cv_value(traj.xyz[frame_index])
     
     def check_mdtraj_within_boundary(self, traj, milestone_variables, 
                                      verbose=False, TOL=0.001):
@@ -306,17 +301,24 @@ class MMVT_closest_pair_CV(MMVT_collective_variable):
         if positions is None:
             state = context.getState(getPositions=True)
             positions = state.getPositions()
-        sum = (1.0 / (self.cutoff_distance * unit.nanometer)) ** self.exponent
+        # Strip the units once, rather than for every pair of atoms
+        if openmm.unit.is_quantity(positions):
+            positions_nm = positions.value_in_unit(openmm.unit.nanometer)
+        else:
+            positions_nm = [position.value_in_unit(openmm.unit.nanometer) \
+                            for position in positions]
+        positions_nm = np.asarray(positions_nm)
+        sum = (1.0 / self.cutoff_distance) ** self.exponent
         for atom_index1 in self.group1:
             for atom_index2 in self.group2:
-                com1 = positions[atom_index1]
-                com2 = positions[atom_index2]
-                dist = np.linalg.norm(com2-com1)
-                if dist < self.cutoff_distance * unit.nanometer:
+                d = positions_nm[atom_index2] - positions_nm[atom_index1]
+                dist = math.sqrt(d @ d)
+                if dist < self.cutoff_distance:
                     sum += (1.0/dist) ** self.exponent
                 
+        # The value is in nanometers
         min_value = sum ** (-1.0/self.exponent)
-        return min_value.value_in_unit(unit.nanometers)
+        return min_value
         
     def check_openmm_context_within_boundary(
             self, context, milestone_variables, positions=None, verbose=False,
@@ -360,19 +362,10 @@ boundary at {:.4f} nm.""".format(value, milestone_value)
             atom_set_list.append(set([traj.atoms[index]]))
         traj.image_molecules(inplace=True, anchor_molecules=atom_set_list)
         #traj.image_molecules(inplace=True, anchor_molecules=[self.group1])
+        milestone_value = milestone_variables["value"]
         distances = []
         for frame_index in range(traj.n_frames):
-            sum = (1.0 / self.cutoff_distance) ** self.exponent
-            for atom_index1 in self.group1:
-                for atom_index2 in self.group2:
-                    com1 = traj.xyz[frame_index, atom_index1,:]
-                    com2 = traj.xyz[frame_index, atom_index2,:]
-                    value = np.linalg.norm(com2-com1)
-                    if value < self.cutoff_distance:
-                        sum += (1.0/value) ** self.exponent
-                    
-            milestone_value = milestone_variables["value"]
-            min_value = sum ** (-1.0/self.exponent)
+            min_value = self._get_frame_cv_value(traj.xyz[frame_index])
             distances.append(min_value - milestone_value)
             
         avg_distance = np.mean(distances)
@@ -2,10 +2,17 @@
 Structures, methods, and functions for handling count-contact CVs.
 """
 
+import math
+
 import numpy as np
 
 from parmed import unit
 
+try:
+    import openmm
+except ImportError:
+    import simtk.openmm as openmm
+
 import seekr2.modules.common_base as base
 import seekr2.modules.mmvt_cvs.mmvt_cv_base as mmvt_cv_base
 from seekr2.modules.mmvt_cvs.mmvt_cv_base import MMVT_collective_variable
@@ -15,7 +22,7 @@ class MMVT_count_contacts_CV(MMVT_collective_variable):
     A collective variable represents the closest distance between a pair
     of atoms out of two sets of atoms.
     
-    """+MMVT_collective_variable.__doc__
+    """
     
     # TODO: further test this CV
     
@@ -55,11 +62,6 @@ class MMVT_count_contacts_CV(MMVT_collective_variable):
         refer to them as forces outside of this layer of the code,
         preferring instead the term: boundary definitions.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         assert self.num_groups == 2
         self.openmm_expression \
             = "step(k_{}*(count - value_{}))".format(
@@ -85,11 +87,6 @@ class MMVT_count_contacts_CV(MMVT_collective_variable):
         """
         
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         closest_force_me = openmm.CustomNonbondedForce("1")
         closest_force_me.addInteractionGroup(self.group1, self.group2)
         closest_force_me.setUseSwitchingFunction(False)
@@ -155,11 +152,6 @@ class MMVT_count_contacts_CV(MMVT_collective_variable):
         variable_names_list. The numerical values of these variables
         will be provided at a later step.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         closest_force = openmm.CustomNonbondedForce("1")
         closest_force.addInteractionGroup(self.group1, self.group2)
         closest_force.setUseSwitchingFunction(False)
@@ -207,9 +199,9 @@ class MMVT_count_contacts_CV(MMVT_collective_variable):
         """
         assert milestone.cv_index == self.index
         values_list = []
-        bitcode = 2**(milestone.alias_index-1)
-        k = milestone.variables["k"] * unit.kilojoules_per_mole/unit.angstrom**2
-        value = milestone.variables["value"] * unit.nanometers
+        bitcode = mmvt_cv_base.get_bitcode(milestone.alias_index)
+        k = milestone.variables["k"] * mmvt_cv_base.K_UNIT
+        value = milestone.variables["value"] * mmvt_cv_base.VALUE_UNIT
         values_list.append(bitcode)
         values_list.append(k)
         values_list.append(value)
@@ -237,11 +229,44 @@ class MMVT_count_contacts_CV(MMVT_collective_variable):
             for atom_index2 in self.group2:
                 com1 = traj.xyz[frame_index, atom_index1,:]
                 com2 = traj.xyz[frame_index, atom_index2,:]
-                if np.linalg.norm(com2-com1) <= self.cutoff_distance:
+                d = com2-com1
+                if math.sqrt(d @ d) <= self.cutoff_distance:
                     count += 1
                 
         return count
     
+    def _count_mdtraj_contacts(self, traj, inclusive=True):
+        """
+        Image an mdtraj object once, then count the close contacts of
+        every frame. A pair at exactly the cutoff distance counts as a
+        contact if inclusive is True.
+        """
+        atom_set_list = []
+        for index in self.group1:
+            atom_set_list.append(set([traj.topology.atom(index)]))
+        traj.image_molecules(inplace=True, anchor_molecules=atom_set_list)
+        counts = np.zeros(traj.n_frames, dtype=int)
+        group2_xyz = traj.xyz[:, self.group2, :]
+        # Loop over the atoms of group1 only, so that the distances of
+        # a single (n_frames, len(group2)) block are held at once
+        for atom_index1 in self.group1:
+            d = group2_xyz - traj.xyz[:, [atom_index1], :]
+            dists = np.sqrt(
+                np.einsum("ijk,ijk->ij", d, d).astype(np.float64))
+            if inclusive:
+                counts += np.count_nonzero(
+                    dists <= self.cutoff_distance, axis=1)
+            else:
+                counts += np.count_nonzero(
+                    dists < self.cutoff_distance, axis=1)
+        return counts
+    
+    def get_mdtraj_cv_values(self, traj):
+        """
+        Determine the CV value for every frame of an mdtraj object.
+        """
+        return self._count_mdtraj_contacts(traj)
+    
     def check_mdtraj_within_boundary(self, traj, milestone_variables, 
                                      verbose=False, TOL=0.0):
         """
@@ -249,12 +274,15 @@ class MMVT_count_contacts_CV(MMVT_collective_variable):
         within the expected anchor. Return True if passed, return
         False if failed.
         """
-        for frame_index in range(traj.n_frames):
-            value = self.get_mdtraj_cv_value(traj, frame_index)
-            result = self.check_value_within_boundary(
-                value, milestone_variables, verbose, tolerance=TOL)
-            if not result:
-                return False
+        values = self.get_mdtraj_cv_values(traj)
+        first_outside = mmvt_cv_base.first_frame_outside_boundary(
+            values, milestone_variables["k"], milestone_variables["value"],
+            TOL)
+        if first_outside is not None:
+            # Report the first frame that falls outside the boundary
+            return self.check_value_within_boundary(
+                int(values[first_outside]), milestone_variables, verbose,
+                tolerance=TOL)
             
         return True
         
@@ -268,13 +296,19 @@ class MMVT_count_contacts_CV(MMVT_collective_variable):
         if positions is None:
             state = context.getState(getPositions=True)
             positions = state.getPositions()
+        # Strip the units once, rather than for every pair of atoms
+        if openmm.unit.is_quantity(positions):
+            positions_nm = positions.value_in_unit(openmm.unit.nanometer)
+        else:
+            positions_nm = [position.value_in_unit(openmm.unit.nanometer) \
+                            for position in positions]
+        positions_nm = np.asarray(positions_nm)
         count = 0
         for atom_index1 in self.group1:
             for atom_index2 in self.group2:
-                com1 = positions[atom_index1]
-                com2 = positions[atom_index2]
-                dist = np.linalg.norm(com2-com1)
-                if dist <= self.cutoff_distance * unit.nanometers:
+                d = positions_nm[atom_index2] - positions_nm[atom_index1]
+                dist = math.sqrt(d @ d)
+                if dist <= self.cutoff_distance:
                     count += 1
         
         return count
@@ -316,22 +350,9 @@ boundary at {:.4f} in number.""".format(value, milestone_value)
         to the MMVT boundary. Return True if passed, return False if 
         failed.
         """
-        atom_set_list = []
-        for index in self.group1:
-            atom_set_list.append(set([traj.topology.atom(index)]))
-        traj.image_molecules(inplace=True, anchor_molecules=atom_set_list)
-        for frame_index in range(traj.n_frames):
-            count = 0
-            for atom_index1 in self.group1:
-                for atom_index2 in self.group2:
-                    com1 = traj.xyz[frame_index, atom_index1,:]
-                    com2 = traj.xyz[frame_index, atom_index2,:]
-                    value = np.linalg.norm(com2-com1)
-                    if value < self.cutoff_distance:
-                        count += 1
-            
-            milestone_value = milestone_variables["value"]
-            
+        counts = self._count_mdtraj_contacts(traj, inclusive=False)
+        milestone_value = milestone_variables["value"]
+        for count in counts.tolist():
             if (count - milestone_value != 1) \
                     and (count - milestone_value != -1):
                 if verbose:
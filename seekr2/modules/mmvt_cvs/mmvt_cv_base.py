@@ -5,9 +5,11 @@ Base classes, objects, and constants used when handling CVs of the
 MMVT calculations.
 """
 
+import numpy as np
 import mdtraj
 
 from abserdes import Serializer
+from parmed import unit
 
 OPENMMVT_BASENAME = "mmvt"
 OPENMMVT_EXTENSION = "out"
@@ -15,6 +17,20 @@ OPENMMVT_GLOB = "%s*.%s" % (OPENMMVT_BASENAME, OPENMMVT_EXTENSION)
 NAMDMMVT_BASENAME = "namdmmvt"
 NAMDMMVT_EXTENSION = "out"
 NAMDMMVT_GLOB = "%s*.%s*" % (NAMDMMVT_BASENAME, NAMDMMVT_EXTENSION)
+# Units of the k and value milestone variables given to the OpenMM forces
+K_UNIT = unit.kilojoules_per_mole/unit.angstrom**2
+VALUE_UNIT = unit.nanometers
+# The bitcode of a milestone alias index is 1 << (alias_index-1)
+BITCODES = tuple(1 << i for i in range(64))
+
+def get_bitcode(alias_index):
+    """
+    Return the bitcode used by the MMVT plugin to identify the
+    milestone with the given alias index.
+    """
+    if alias_index <= len(BITCODES):
+        return BITCODES[alias_index-1]
+    return 1 << (alias_index-1)
 
 def traj_center_of_mass(traj):
     """
@@ -27,6 +43,66 @@ def traj_center_of_mass(traj):
         com_array = mdtraj.compute_center_of_mass(traj)
     return com_array
 
+def group_mass_weights(topology, atom_indices):
+    """
+    Returns the masses of a group of atoms within topology, normalized
+    to sum to one, for use with traj_group_center_of_mass().
+    """
+    masses = np.array([topology.atom(index).element.mass \
+                       for index in atom_indices])
+    masses /= masses.sum()
+    return masses
+
+def traj_group_center_of_mass(traj, atom_indices, weights=None):
+    """
+    Returns a center of mass array by frames for a group of atoms
+    within traj, without slicing a new trajectory out of traj. The
+    normalized masses may be passed as weights if they were already
+    computed by group_mass_weights().
+    """
+    if len(atom_indices) == 1:
+        com_array = traj.xyz[:,atom_indices[0],:]
+    else:
+        if weights is None:
+            weights = group_mass_weights(traj.topology, atom_indices)
+        com_array = np.einsum(
+            "fij,i->fj", traj.xyz[:,atom_indices,:], weights)
+    return com_array
+
+def com_distance_residuals(com1_array, com2_array, radius, diff_out=None,
+                           out=None):
+    """
+    Returns, by frames, the distance between two center of mass arrays
+    minus a radius. The squares, square root, and subtraction are all
+    done within a single buffer. Preallocated float64 buffers of shape
+    (n_frames, 3) and (n_frames,) may be passed as diff_out and out to
+    avoid allocating new arrays.
+    """
+    diff = np.subtract(com2_array, com1_array, out=diff_out)
+    residuals = np.einsum("ij,ij->i", diff, diff, out=out)
+    np.sqrt(residuals, out=residuals)
+    residuals -= radius
+    return residuals
+
+def first_frame_outside_boundary(values, milestone_k, milestone_value,
+                                 tolerance=0.0):
+    """
+    Given the CV values of every frame, return the index of the first
+    frame for which milestone_k*(value - milestone_value) exceeds the
+    tolerance, or None if every frame lies within the boundary.
+    """
+    values = np.asarray(values)
+    # The boundary is a half-space, so testing the single frame that
+    # lies furthest along k decides the common all-passed case.
+    if milestone_k > 0.0:
+        worst = values.max()
+    else:
+        worst = values.min()
+    if milestone_k*(worst - milestone_value) <= tolerance:
+        return None
+    outside = milestone_k*(values - milestone_value) > tolerance
+    return int(np.argmax(outside))
+
 class MMVT_settings(Serializer):
     """
     Settings that are specific to an MMVT calculation.
@@ -164,7 +240,7 @@ class MMVT_collective_variable(Serializer):
         raise Exception("This base class cannot be used for creating a "\
                         "collective variable boundary definition.")
         
-class MMVT_anchor(Serializer):
+class MMVT_anchor(Serializer, blacklist=["_milestone_maps"]):
     """
     An anchor object for representing a Voronoi cell in an MMVT 
     calculation.
@@ -238,25 +314,52 @@ class MMVT_anchor(Serializer):
         self.bulkstate = False
         self.milestones = []
         self.variables = {}
+        self._milestone_maps = None
         return
     
+    def _invalidate_milestone_maps(self):
+        """
+        Discard the cached milestone dictionaries. Must be called if
+        any milestone in self.milestones is modified in place.
+        """
+        self._milestone_maps = None
+        return
+    
+    def _get_milestone_map(self, key_attr, value_attr):
+        """
+        Return a dictionary that maps the key_attr of each milestone to
+        its value_attr. Each dictionary is only built the first time it
+        is requested, and is cached until the milestone list has been
+        replaced or has changed length.
+        """
+        # Deserialized anchors are created without calling __init__
+        milestone_maps = getattr(self, "_milestone_maps", None)
+        milestones_key = (id(self.milestones), len(self.milestones))
+        if milestone_maps is None or milestone_maps[0] != milestones_key:
+            milestone_maps = (milestones_key, {})
+            self._milestone_maps = milestone_maps
+        
+        maps = milestone_maps[1]
+        milestone_map = maps.get((key_attr, value_attr))
+        if milestone_map is None:
+            milestone_map = {}
+            for milestone in self.milestones:
+                milestone_map[getattr(milestone, key_attr)] \
+                    = getattr(milestone, value_attr)
+            maps[(key_attr, value_attr)] = milestone_map
+        return milestone_map
+    
     def _make_milestone_collection(self):
         """
         Make the dictionaries that allow for easy access of milestone
         indices, aliases, and neighboring indices.
         """
-        id_key_alias_value_dict = {}
-        alias_key_id_value_dict = {}
-        neighbor_id_key_alias_value_dict = {}
-        
-        for milestone in self.milestones:
-                index = milestone.index
-                neighbor_index = milestone.neighbor_anchor_index
-                alias_index = milestone.alias_index
-                id_key_alias_value_dict[index] = alias_index
-                neighbor_id_key_alias_value_dict[neighbor_index] = alias_index
-                alias_key_id_value_dict[alias_index] = index
-        
+        id_key_alias_value_dict = self._get_milestone_map(
+            "index", "alias_index")
+        alias_key_id_value_dict = self._get_milestone_map(
+            "alias_index", "index")
+        neighbor_id_key_alias_value_dict = self._get_milestone_map(
+            "neighbor_anchor_index", "alias_index")
         return id_key_alias_value_dict, alias_key_id_value_dict, \
             neighbor_id_key_alias_value_dict
     
@@ -265,46 +368,30 @@ class MMVT_anchor(Serializer):
         Accept the alias index of a milestone and return the model-wide
         index of the milestone.
         """
-        id_key_alias_value_dict, alias_key_id_value_dict, \
-            neighbor_id_key_alias_value_dict = self._make_milestone_collection()
-        if alias_id in alias_key_id_value_dict:
-            return alias_key_id_value_dict[alias_id]
-        else:
-            return None
+        return self._get_milestone_map("alias_index", "index").get(alias_id)
     
     def alias_from_id(self, my_id):
         """
         Accept the model-wide index and return the milestone's alias
         index.
         """
-        id_key_alias_value_dict, alias_key_id_value_dict, \
-            neighbor_id_key_alias_value_dict = self._make_milestone_collection()
-        if my_id in id_key_alias_value_dict:
-            return id_key_alias_value_dict[my_id]
-        else:
-            return None
+        return self._get_milestone_map("index", "alias_index").get(my_id)
         
     def alias_from_neighbor_id(self, neighbor_id):
         """
         Take the index of the neighbor anchor's index and provide the
         milestone's alias index.
         """
-        id_key_alias_value_dict, alias_key_id_value_dict, \
-            neighbor_id_key_alias_value_dict = self._make_milestone_collection()
-        if neighbor_id in neighbor_id_key_alias_value_dict:
-            return neighbor_id_key_alias_value_dict[neighbor_id]
-        else:
-            return None
+        return self._get_milestone_map(
+            "neighbor_anchor_index", "alias_index").get(neighbor_id)
         
     def get_ids(self):
         """
         Return a list of model-wide incides.
         """
-        id_key_alias_value_dict, alias_key_id_value_dict, \
-            neighbor_id_key_alias_value_dict = self._make_milestone_collection()
-        return list(id_key_alias_value_dict.keys())
+        return list(self._get_milestone_map("index", "alias_index").keys())
     
-class MMVT_toy_anchor(MMVT_anchor):
+class MMVT_toy_anchor(MMVT_anchor, blacklist=["_milestone_maps"]):
     """
     An anchor object for representing a Voronoi cell in an MMVT 
     calculation within a toy system.
@@ -367,4 +454,5 @@ class MMVT_toy_anchor(MMVT_anchor):
         self.bulkstate = False
         self.milestones = []
         self.variables = {}
+        self._milestone_maps = None
         return
\ No newline at end of file
@@ -8,6 +8,11 @@ import math
 
 from parmed import unit
 
+try:
+    import openmm
+except ImportError:
+    import simtk.openmm as openmm
+
 import seekr2.modules.common_base as base
 import seekr2.modules.mmvt_cvs.mmvt_cv_base as mmvt_cv_base
 from seekr2.modules.mmvt_cvs.mmvt_cv_base import MMVT_collective_variable
@@ -16,7 +21,7 @@ class MMVT_external_CV(MMVT_collective_variable):
     """
     A collective variable that depends on external coordinates.
     
-    """+MMVT_collective_variable.__doc__
+    """
     
     def __init__(self, index, groups):
         self.index = index
@@ -51,11 +56,6 @@ class MMVT_external_CV(MMVT_collective_variable):
         refer to them as forces outside of this layer of the code,
         preferring instead the term: boundary definitions.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         expression_w_bitcode = "bitcode*"+self.openmm_expression
         return openmm.CustomCentroidBondForce(
             self.num_groups, expression_w_bitcode)
@@ -65,18 +65,10 @@ class MMVT_external_CV(MMVT_collective_variable):
         Create an OpenMM force object that will restrain the system to
         a given value of this CV.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
         return openmm.CustomCentroidBondForce(
             self.num_groups, self.restraining_expression)
     
     def make_cv_force(self, alias_id):
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
         return openmm.CustomCentroidBondForce(
             self.num_groups, self.cv_expression)
     
@@ -84,11 +76,6 @@ class MMVT_external_CV(MMVT_collective_variable):
         """
         
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         me_expr = "(me_val - {})^2".format(self.cv_expression)
         me_force = openmm.CustomCentroidBondForce(self.num_groups, me_expr)
         me_group_list = []
@@ -188,7 +175,7 @@ class MMVT_external_CV(MMVT_collective_variable):
         """
         assert milestone.cv_index == self.index
         values_list = []
-        bitcode = 2**(milestone.alias_index-1)
+        bitcode = mmvt_cv_base.get_bitcode(milestone.alias_index)
         values_list.append(bitcode)
         k_val = milestone.variables["k"]
         values_list.append(k_val)
@@ -209,21 +196,39 @@ class MMVT_external_CV(MMVT_collective_variable):
         """
         Determine the current CV value for an mdtraj object.
         """
-        positions = traj.xyz[frame_index, :,:] * unit.nanometers
-        value = self.get_cv_value(positions)
+        # mdtraj positions are already unitless nanometers
+        value = self._get_cv_value_nm(traj.xyz[frame_index, :,:])
         return value
     
+    def get_mdtraj_cv_values(self, traj):
+        """
+        Determine the CV values of every frame of an mdtraj object,
+        evaluating the expression once over all the frames.
+        """
+        # Evaluate in double precision, like the single-frame path
+        xyz = traj.xyz.astype(np.float64)
+        namespace = {}
+        for i in range(traj.n_atoms):
+            namespace["x{}".format(i+1)] = xyz[:,i,0]
+            namespace["y{}".format(i+1)] = xyz[:,i,1]
+            namespace["z{}".format(i+1)] = xyz[:,i,2]
+        
+        exec(base.compile_cv_expression(self.cv_expression),
+             base.CV_EXEC_GLOBALS_BATCHED, namespace)
+        values = np.broadcast_to(namespace["result"], (traj.n_frames,))
+        return values
+    
     def check_mdtraj_within_boundary(self, traj, milestone_variables, 
                                      verbose=False, TOL=0.001):
         """
         For now, this will just always return True.
         """
-        for frame_index in range(traj.n_frames):
-            value = self.get_mdtraj_cv_value(traj, frame_index)
-            result = self.check_value_within_boundary(
-                value, milestone_variables, tolerance=TOL)
-            if not result:
-                return False
+        values = self.get_mdtraj_cv_values(traj)
+        # Same test as check_value_within_boundary, for all the frames
+        within = milestone_variables["k"] \
+            * (values - milestone_variables["value"]) + TOL < 0
+        if not within.all():
+            return False
             
         return True
     
@@ -257,44 +262,31 @@ class MMVT_external_CV(MMVT_collective_variable):
         """
         Get the value of the cv for the set of positions.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
-        sqrt = math.sqrt
-        exp = math.exp
-        log = math.log
-        sin = math.sin
-        cos = math.cos
-        tan = math.tan
-        asin = math.asin
-        acos = math.acos
-        atan = math.atan
-        sinh = math.sinh
-        cosh = math.cosh
-        tanh = math.tanh
-        erf = math.erf
-        erfc = math.erfc
-        floor = math.floor
-        ceil = math.ceil
-        step = lambda x : 0 if x < 0 else 1
-        delta = lambda x : 1 if x == 0 else 0
-        select = lambda x, y, z : z if x == 0 else y
-        expr = ""
-        for i, position in enumerate(positions):
-            expr_x = "x{} = {};".format(i+1, position[0].value_in_unit(
-                openmm.unit.nanometer))
-            expr_y = "y{} = {};".format(i+1, position[1].value_in_unit(
-                openmm.unit.nanometer))
-            expr_z = "z{} = {};".format(i+1, position[2].value_in_unit(
-                openmm.unit.nanometer))
-            expr += expr_x + expr_y + expr_z
-            
-        expr += base.convert_openmm_to_python_expr("result="+self.cv_expression)
-        mylocals = locals()
-        exec(expr, globals(), mylocals)
-        result = mylocals["result"]
+        # Convert all the positions at once, rather than coordinate by
+        # coordinate
+        if openmm.unit.is_quantity(positions):
+            positions_nm = positions.value_in_unit(openmm.unit.nanometer)
+        else:
+            positions_nm = [position.value_in_unit(openmm.unit.nanometer) \
+                            for position in positions]
+        return self._get_cv_value_nm(positions_nm)
+    
+    def _get_cv_value_nm(self, positions_nm):
+        """
+        Get the value of the cv for unitless positions, given as an
+        (n_atoms, 3) array in nanometers.
+        """
+        # tolist() gives Python floats, so mdtraj's float32 coordinates
+        # are evaluated in double precision
+        namespace = {}
+        for i, (x, y, z) in enumerate(np.asarray(positions_nm).tolist()):
+            namespace["x{}".format(i+1)] = x
+            namespace["y{}".format(i+1)] = y
+            namespace["z{}".format(i+1)] = z
+        
+        exec(base.compile_cv_expression(self.cv_expression),
+             base.CV_EXEC_GLOBALS, namespace)
+        result = namespace["result"]
         return result
     
     def check_value_within_boundary(
@@ -312,15 +304,8 @@ class MMVT_external_CV(MMVT_collective_variable):
         """
         
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
-        new_positions = []
-        for position in positions:
-            new_positions.append(position*openmm.unit.nanometer)
-        value = self.get_cv_value(new_positions)
+        # The positions are already in nm, so skip the Quantity round-trip
+        value = self._get_cv_value_nm(positions)
         result = self.check_value_within_boundary(
             value, milestone_variables)
         return result
@@ -330,15 +315,13 @@ class MMVT_external_CV(MMVT_collective_variable):
         """
         For now, this will just always return True.
         """
-        distances = []
-        for frame_index in range(traj.n_frames):
-            value = self.get_mdtraj_cv_value(traj, frame_index)
-            milestone_value = milestone_variables["value"]
-            distances.append(value - milestone_value)
-            
-        assert np.isfinite(distances).all(), "Non-finite numbers detected in \
-            'distances'."
+        distances = self.get_mdtraj_cv_values(traj) \
+            - milestone_variables["value"]
         avg_distance = np.mean(distances)
+        # Any NaN or infinite distance makes the mean non-finite, so the
+        # distances don't need a separate pass of their own
+        assert math.isfinite(avg_distance), "Non-finite numbers detected in \
+            'distances'."
         std_distance = np.std(distances)
         if abs(avg_distance) > max_avg or std_distance > max_std:
             if verbose:
@@ -385,4 +368,6 @@ def make_mmvt_external_cv_object(external_cv_input, index):
         cv.restraining_expression = "0.5*k*("+cv.cv_expression+" - value)^2"
     else:
         cv.restraining_expression = external_cv_input.restraining_expression
+    # Compile the CV expression now, rather than on first evaluation
+    base.compile_cv_expression(cv.cv_expression)
     return cv
\ No newline at end of file
@@ -3,20 +3,39 @@ Structures, methods, and functions for handling Spherical CVs.
 (COM-COM distance CV).
 """
 
+import weakref
+
 import numpy as np
 
-from parmed import unit
+try:
+    import openmm
+except ImportError:
+    import simtk.openmm as openmm
 
 import seekr2.modules.common_base as base
 import seekr2.modules.mmvt_cvs.mmvt_cv_base as mmvt_cv_base
 from seekr2.modules.mmvt_cvs.mmvt_cv_base import MMVT_collective_variable
 
-class MMVT_planar_CV(MMVT_collective_variable):
+def _planar_values(com1_array, com2_array, com3_array):
+    """
+    Compute the planar CV for arrays of centers of mass by frames:
+    the fraction of the way along the start-end axis that the mobile
+    group's projection onto that axis lies.
+    """
+    d12 = com2_array - com1_array
+    d13 = com3_array - com1_array
+    # Row-wise dot products, without the elementwise product arrays
+    values = np.einsum("ij,ij->i", d12, d13)
+    values /= np.einsum("ij,ij->i", d12, d12)
+    return values
+
+class MMVT_planar_CV(
+        MMVT_collective_variable, blacklist=["_group_weights"]):
     """
     A planar incremental variable represents the distance between two
     different groups of atoms.
     
-    """+MMVT_collective_variable.__doc__
+    """
     
     def __init__(self, index, start_group, end_group, mobile_group):
         self.index = index
@@ -38,6 +57,7 @@ class MMVT_planar_CV(MMVT_collective_variable):
         self.global_variables = []
         self._mygroup_list = None
         self.variable_name = "v"
+        self._group_weights = None
         return
 
     def __name__(self):
@@ -58,11 +78,6 @@ class MMVT_planar_CV(MMVT_collective_variable):
         refer to them as forces outside of this layer of the code,
         preferring instead the term: boundary definitions.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         assert self.num_groups == 3
         expression_w_bitcode = "bitcode*"+self.openmm_expression
         return openmm.CustomCentroidBondForce(
@@ -73,20 +88,11 @@ class MMVT_planar_CV(MMVT_collective_variable):
         Create an OpenMM force object that will restrain the system to
         a given value of this CV.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         assert self.num_groups == 3
         return openmm.CustomCentroidBondForce(
             self.num_groups, self.restraining_expression)
     
     def make_cv_force(self, alias_id):
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
         return openmm.CustomCentroidBondForce(
             self.num_groups, self.cv_expression)
     
@@ -94,11 +100,6 @@ class MMVT_planar_CV(MMVT_collective_variable):
         """
         
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         me_expr = "(me_val - {})^2".format(self.cv_expression)
         me_force = openmm.CustomCentroidBondForce(
             self.num_groups, me_expr)
@@ -199,9 +200,9 @@ class MMVT_planar_CV(MMVT_collective_variable):
         """
         assert milestone.cv_index == self.index
         values_list = []
-        bitcode = 2**(milestone.alias_index-1)
-        k = milestone.variables["k"] * unit.kilojoules_per_mole/unit.angstrom**2
-        value = milestone.variables["value"] * unit.nanometers
+        bitcode = mmvt_cv_base.get_bitcode(milestone.alias_index)
+        k = milestone.variables["k"] * mmvt_cv_base.K_UNIT
+        value = milestone.variables["value"] * mmvt_cv_base.VALUE_UNIT
         values_list.append(bitcode)
         values_list.append(k)
         values_list.append(value)
@@ -216,29 +217,61 @@ class MMVT_planar_CV(MMVT_collective_variable):
         """
         raise Exception("MMVT Planar CVs are not available in NAMD")
     
+    def _get_group_weights(self, topology):
+        """
+        Return the start, end, and mobile groups as int32 index arrays,
+        each paired with its normalized atomic masses (or None for a
+        single-atom group, whose position is its center of mass). These
+        only depend on the topology, so they are computed once for all
+        of the trajectories that share it.
+        """
+        # Deserialized CVs are created without calling __init__
+        group_weights = getattr(self, "_group_weights", None)
+        if group_weights is None or group_weights[0]() is not topology:
+            weights_list = []
+            for group in (self.start_group, self.end_group,
+                          self.mobile_group):
+                indices = np.asarray(group, dtype=np.int32)
+                if len(indices) == 1:
+                    # Never used, and massless (toy) atoms would make
+                    # the normalization divide by zero
+                    weights = None
+                else:
+                    weights = mmvt_cv_base.group_mass_weights(
+                        topology, indices)
+                weights_list.append((indices, weights))
+            group_weights = (weakref.ref(topology), weights_list)
+            self._group_weights = group_weights
+        return group_weights[1]
+    
+    def _get_com_arrays(self, traj):
+        """
+        Return the center of mass arrays of the start, end, and mobile
+        groups for every frame of traj.
+        """
+        com_arrays = tuple(
+            mmvt_cv_base.traj_group_center_of_mass(traj, indices, weights) \
+            for indices, weights in self._get_group_weights(traj.topology))
+        return com_arrays
+    
     def get_mdtraj_cv_value(self, traj, frame_index):
         """
         Determine the current CV value for an mdtraj object.
         """
-        traj1 = traj.atom_slice(self.start_group)
-        traj2 = traj.atom_slice(self.end_group)
-        traj3 = traj.atom_slice(self.mobile_group)
-        com1_array = mmvt_cv_base.traj_center_of_mass(traj1)
-        com2_array = mmvt_cv_base.traj_center_of_mass(traj2)
-        com3_array = mmvt_cv_base.traj_center_of_mass(traj3)
-        #com1_array = mdtraj.compute_center_of_mass(traj1)
-        #com2_array = mdtraj.compute_center_of_mass(traj2)
-        #com3_array = mdtraj.compute_center_of_mass(traj3)
-        com1 = com1_array[frame_index,:]
-        com2 = com2_array[frame_index,:]
-        com3 = com3_array[frame_index,:]
-        dist1_2 = np.linalg.norm(com2-com1)
-        #dist1_3 = np.linalg.norm(com3-com1)
-        value = ((com2[0]-com1[0])*(com3[0]-com1[0]) \
-               + (com2[1]-com1[1])*(com3[1]-com1[1]) \
-               + (com2[2]-com1[2])*(com3[2]-com1[2]))/(dist1_2*dist1_2)
+        com1_array, com2_array, com3_array = self._get_com_arrays(traj)
+        value = _planar_values(com1_array[[frame_index],:],
+                               com2_array[[frame_index],:],
+                               com3_array[[frame_index],:])[0]
         return value
     
+    def get_mdtraj_cv_values(self, traj):
+        """
+        Determine the CV value for every frame of an mdtraj object at
+        once, instead of one frame at a time.
+        """
+        com1_array, com2_array, com3_array = self._get_com_arrays(traj)
+        return _planar_values(com1_array, com2_array, com3_array)
+    
     def check_mdtraj_within_boundary(self, traj, milestone_variables, 
                                      verbose=False, TOL=0.001):
         """
@@ -246,12 +279,15 @@ class MMVT_planar_CV(MMVT_collective_variable):
         within the expected anchor. Return True if passed, return
         False if failed.
         """
-        for frame_index in range(traj.n_frames):
-            value = self.get_mdtraj_cv_value(traj, frame_index)
-            result = self.check_value_within_boundary(
-                value, milestone_variables, verbose=verbose, tolerance=TOL)
-            if not result:
-                return False
+        values = self.get_mdtraj_cv_values(traj)
+        first_outside = mmvt_cv_base.first_frame_outside_boundary(
+            values, milestone_variables["k"], milestone_variables["value"],
+            TOL)
+        if first_outside is not None:
+            # Report the first frame that falls outside the boundary
+            return self.check_value_within_boundary(
+                values[first_outside], milestone_variables, verbose=verbose,
+                tolerance=TOL)
             
         return True
     
@@ -270,13 +306,10 @@ class MMVT_planar_CV(MMVT_collective_variable):
             system, positions, self.end_group)
         com3 = base.get_openmm_center_of_mass_com(
             system, positions, self.mobile_group)
-        dist1_2 = np.linalg.norm(com2-com1)
-        #dist1_3 = np.linalg.norm(com3-com1)
-        value = ((com2[0]-com1[0])*(com3[0]-com1[0]) \
-               + (com2[1]-com1[1])*(com3[1]-com1[1]) \
-               + (com2[2]-com1[2])*(com3[2]-com1[2]))/(dist1_2*dist1_2)
-        return value.value_in_unit(unit.nanometers**2)
-        #return value
+        d12 = (com2-com1).value_in_unit(openmm.unit.nanometers)
+        d13 = (com3-com1).value_in_unit(openmm.unit.nanometers)
+        value = (d12 @ d13) / (d12 @ d12)
+        return value
         
     def check_openmm_context_within_boundary(
             self, context, milestone_variables, positions=None, verbose=False,
@@ -311,12 +344,7 @@ class MMVT_planar_CV(MMVT_collective_variable):
         to the MMVT boundary. Return True if passed, return False if 
         failed.
         """
-        values = []
-        for frame_index in range(traj.n_frames):
-            value = self.get_mdtraj_cv_value(traj, frame_index)
-            milestone_value = milestone_variables["value"]
-            values.append(value - milestone_value)
-            
+        values = self.get_mdtraj_cv_values(traj) - milestone_variables["value"]
         avg_distance = np.mean(values)
         std_distance = np.std(values)
         if abs(avg_distance) > max_avg or std_distance > max_std:
@@ -11,16 +11,28 @@ import mdtraj
 
 from parmed import unit
 
+try:
+    import openmm
+except ImportError:
+    import simtk.openmm as openmm
+
+try:
+    import openmm.app as openmm_app
+except ImportError:
+    import simtk.openmm.app as openmm_app
+
 import seekr2.modules.common_base as base
 import seekr2.modules.mmvt_cvs.mmvt_cv_base as mmvt_cv_base
 from seekr2.modules.mmvt_cvs.mmvt_cv_base import MMVT_collective_variable
 
-class MMVT_RMSD_CV(MMVT_collective_variable):
+class MMVT_RMSD_CV(
+        MMVT_collective_variable,
+        blacklist=["_reference_cache"]):
     """
     A RMSD collective variable which is the root mean squared deviation
     of the system from a reference structure.
     
-    """+MMVT_collective_variable.__doc__
+    """
     
     def __init__(self, index, group, ref_structure):
         self.index = index
@@ -35,11 +47,36 @@ class MMVT_RMSD_CV(MMVT_collective_variable):
         self.global_variables = [] #["k", "value"]
         self._mygroup_list = None
         self.variable_name = "v"
+        self._reference_cache = None
         return
 
     def __name__(self):
         return "MMVT_RMSD_CV"
     
+    def _load_reference(self):
+        """
+        Load the reference structure for both the OpenMM forces and the
+        mdtraj checks. Return the mdtraj reference Trajectory, that
+        Trajectory sliced to this CV's atom group, and the OpenMM
+        positions of the reference. The file is only parsed again if
+        ref_structure has changed.
+        """
+        # Deserialized CVs are created without calling __init__
+        reference_cache = getattr(self, "_reference_cache", None)
+        if reference_cache is None \
+                or reference_cache[0] != self.ref_structure:
+            assert os.path.exists(self.ref_structure), \
+                "File {} does not exist. Make sure ".format(self.ref_structure) \
+                +"that any programs using the get_mdtraj_cv_value() method " \
+                "within an API is performed in the model directory."
+            ref_traj = mdtraj.load(self.ref_structure)
+            ref_traj1 = ref_traj.atom_slice(self.group)
+            pdb_file = openmm_app.PDBFile(self.ref_structure)
+            reference_cache = (self.ref_structure, ref_traj, ref_traj1,
+                               pdb_file.positions)
+            self._reference_cache = reference_cache
+        return reference_cache[1:]
+    
     def make_boundary_force(self, alias_id):
         """
         Create an OpenMM force object which will be used to compute
@@ -55,11 +92,6 @@ class MMVT_RMSD_CV(MMVT_collective_variable):
         refer to them as forces outside of this layer of the code,
         preferring instead the term: boundary definitions.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         assert self.num_groups == 1
         self.openmm_expression = "step(k_{}*(RMSD - value_{}))".format(alias_id, alias_id)
         expression_w_bitcode = "bitcode_{}*".format(alias_id)+self.openmm_expression
@@ -70,20 +102,11 @@ class MMVT_RMSD_CV(MMVT_collective_variable):
         Create an OpenMM force object that will restrain the system to
         a given value of this CV.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-        
         assert self.num_groups == 1
         self.restraining_expression = "0.5*k_{}*(RMSD - value_{})^2".format(alias_id, alias_id)
         return openmm.CustomCVForce(self.restraining_expression)
     
     def make_cv_force(self, alias_id):
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
         return openmm.CustomCentroidBondForce(
             self.num_groups, self.cv_expression)
     
@@ -91,19 +114,9 @@ class MMVT_RMSD_CV(MMVT_collective_variable):
         """
         
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-        
-        try:
-            import openmm.app as openmm_app
-        except ImportError:
-            import simtk.openmm.app as openmm_app
-            
-        pdb_file = openmm_app.PDBFile(self.ref_structure)
-        rmsd_me_force = openmm.RMSDForce(pdb_file.positions, self.group)
-        rmsd_neighbor_force = openmm.RMSDForce(pdb_file.positions, self.group)
+        ref_traj, ref_traj1, ref_positions = self._load_reference()
+        rmsd_me_force = openmm.RMSDForce(ref_positions, self.group)
+        rmsd_neighbor_force = openmm.RMSDForce(ref_positions, self.group)
         
         me_expr = "(me_val_{}_alias_{} - {})^2".format(self.index, alias_id, self.cv_expression)
         me_force = openmm.CustomCVForce(me_expr)
@@ -150,18 +163,8 @@ class MMVT_RMSD_CV(MMVT_collective_variable):
         variable_names_list. The numerical values of these variables
         will be provided at a later step.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
-        try:
-            import openmm.app as openmm_app
-        except ImportError:
-            import simtk.openmm.app as openmm_app
-            
-        pdb_file = openmm_app.PDBFile(self.ref_structure)
-        rmsd_force = openmm.RMSDForce(pdb_file.positions, self.group)
+        ref_traj, ref_traj1, ref_positions = self._load_reference()
+        rmsd_force = openmm.RMSDForce(ref_positions, self.group)
         force.addCollectiveVariable("RMSD", rmsd_force)
         
         return
@@ -196,9 +199,9 @@ class MMVT_RMSD_CV(MMVT_collective_variable):
         """
         assert milestone.cv_index == self.index
         values_list = []
-        bitcode = 2**(milestone.alias_index-1)
-        k = milestone.variables["k"] * unit.kilojoules_per_mole/unit.angstrom**2
-        value = milestone.variables["value"] * unit.nanometers
+        bitcode = mmvt_cv_base.get_bitcode(milestone.alias_index)
+        k = milestone.variables["k"] * mmvt_cv_base.K_UNIT
+        value = milestone.variables["value"] * mmvt_cv_base.VALUE_UNIT
         values_list.append(bitcode)
         values_list.append(k)
         values_list.append(value)
@@ -217,17 +220,21 @@ class MMVT_RMSD_CV(MMVT_collective_variable):
         """
         Determine the current CV value for an mdtraj object.
         """
+        value = float(self.get_mdtraj_cv_values(traj)[frame_index])
+        return value
+    
+    def get_mdtraj_cv_values(self, traj):
+        """
+        Determine the CV value for every frame of an mdtraj object with
+        a single superpose and mdtraj.rmsd() call over all the frames.
+        """
         traj1 = traj.atom_slice(self.group)
-        assert os.path.exists(self.ref_structure), \
-            "File {} does not exist. Make sure ".format(self.ref_structure) \
-            +"that any programs using the get_mdtraj_cv_value() method " \
-            "within an API is performed in the model directory."
-        ref_traj = mdtraj.load(self.ref_structure)
-        ref_traj1 = ref_traj.atom_slice(self.group)
+        ref_traj, ref_traj1, ref_positions = self._load_reference()
+        # mdtraj.rmsd() aligns the frames itself, but loses precision
+        # for frames very close to the reference unless they have
+        # already been superposed
         traj1.superpose(ref_traj1)
-        my_rmsd = mdtraj.rmsd(traj1, ref_traj1)
-        value = float(my_rmsd[frame_index])
-        return value
+        return mdtraj.rmsd(traj1, ref_traj1)
     
     def check_mdtraj_within_boundary(self, traj, milestone_variables, 
                                      verbose=False, TOL=0.001):
@@ -236,12 +243,15 @@ class MMVT_RMSD_CV(MMVT_collective_variable):
         within the expected anchor. Return True if passed, return
         False if failed.
         """
-        for frame_index in range(traj.n_frames):
-            value = self.get_mdtraj_cv_value(traj, frame_index)
-            result = self.check_value_within_boundary(
-                value, milestone_variables, verbose=verbose, tolerance=TOL)
-            if not result:
-                return False
+        values = self.get_mdtraj_cv_values(traj)
+        first_outside = mmvt_cv_base.first_frame_outside_boundary(
+            values, milestone_variables["k"], milestone_variables["value"],
+            TOL)
+        if first_outside is not None:
+            # Report the first frame that falls outside the boundary
+            return self.check_value_within_boundary(
+                float(values[first_outside]), milestone_variables,
+                verbose=verbose, tolerance=TOL)
             
         return True
     
@@ -251,11 +261,6 @@ class MMVT_RMSD_CV(MMVT_collective_variable):
         """
         
         """
-        try:
-            import openmm.app as openmm_app
-        except ImportError:
-            import simtk.openmm.app as openmm_app
-            
         if system is None:
             system = context.getSystem()
         if positions is None:
@@ -263,9 +268,7 @@ class MMVT_RMSD_CV(MMVT_collective_variable):
             positions = state.getPositions()
             
         if ref_positions is None:
-            pdb_filename = self.ref_structure
-            pdb_file = openmm_app.PDBFile(pdb_filename)
-            ref_positions = pdb_file.positions
+            ref_traj, ref_traj1, ref_positions = self._load_reference()
         
         pos_subset = []
         ref_subset = []
@@ -328,14 +331,7 @@ boundary at {:.4f} nm.""".format(value, milestone_value)
         failed.
         """
         
-        TOL = 0.001
-        diffs = []
-        for frame_index in range(traj.n_frames):
-            value = self.get_mdtraj_cv_value(traj, frame_index)
-            milestone_value = milestone_variables["value"]
-            diff = value - milestone_value
-            diffs.append(diff)
-            
+        diffs = self.get_mdtraj_cv_values(traj) - milestone_variables["value"]
         avg_diff = np.mean(diffs)
         std_diff = np.std(diffs)
         if abs(avg_diff) > max_avg or std_diff > max_std:
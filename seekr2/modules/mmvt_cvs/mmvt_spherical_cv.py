@@ -3,20 +3,46 @@ Structures, methods, and functions for handling Spherical CVs.
 (COM-COM distance CV).
 """
 
+import math
+
 import numpy as np
 
-from parmed import unit
+try:
+    import openmm
+except ImportError:
+    import simtk.openmm as openmm
 
 import seekr2.modules.common_base as base
 import seekr2.modules.mmvt_cvs.mmvt_cv_base as mmvt_cv_base
 from seekr2.modules.mmvt_cvs.mmvt_cv_base import MMVT_collective_variable
 
-class MMVT_spherical_CV(MMVT_collective_variable):
+# Conversion factor from OpenMM's nanometers to NAMD's Angstroms
+NM_TO_ANGSTROMS = 10.0
+
+# %-style templates for the NAMD input, which are cheaper to fill in
+# than str.format templates. The %s conversion gives the same output
+# as the {} fields they replace.
+NAMD_COLVAR_TEMPLATE = """
+colvar {
+  name collective_variable_%d
+  outputappliedforce         off
+  distance {
+    group1 { atomNumbers %s }
+    group2 { atomNumbers %s }
+  }
+}
+"""
+NAMD_EVALUATION_TEMPLATE = "%s * ($%s_%d - %s) > 0"
+
+class MMVT_spherical_CV(
+        MMVT_collective_variable,
+        blacklist=["_namd_colvar_string", "_diff_buf", "_radii_buf",
+                   "_group_indices"]):
     """
     A spherical collective variable represents the distance between two
     different groups of atoms.
     
-    """+MMVT_collective_variable.__doc__
+    """
     
     def __init__(self, index, groups):
         self.index = index
@@ -31,6 +57,10 @@ class MMVT_spherical_CV(MMVT_collective_variable):
         self.global_variables = []
         self._mygroup_list = None
         self.variable_name = "r"
+        self._namd_colvar_string = None
+        self._diff_buf = None
+        self._radii_buf = None
+        self._group_indices = None
         return
 
     def __name__(self):
@@ -51,11 +81,6 @@ class MMVT_spherical_CV(MMVT_collective_variable):
         refer to them as forces outside of this layer of the code,
         preferring instead the term: boundary definitions.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         assert self.num_groups == 2
         expression_w_bitcode = "bitcode*"+self.openmm_expression
         return openmm.CustomCentroidBondForce(
@@ -66,11 +91,6 @@ class MMVT_spherical_CV(MMVT_collective_variable):
         Create an OpenMM force object that will restrain the system to
         a given value of this CV.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         assert self.num_groups == 2
         return openmm.CustomCentroidBondForce(
             self.num_groups, self.restraining_expression)
@@ -80,11 +100,6 @@ class MMVT_spherical_CV(MMVT_collective_variable):
         Make a force that is composed only of the cv_expression.
         Used for metadynamics and potentially other things.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         assert self.num_groups == 2
         return openmm.CustomCentroidBondForce(
             self.num_groups, self.cv_expression)
@@ -93,11 +108,6 @@ class MMVT_spherical_CV(MMVT_collective_variable):
         """
         
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         me_expr = "(me_val - {})^2".format(self.cv_expression)
         me_force = openmm.CustomCentroidBondForce(
             self.num_groups, me_expr)
@@ -132,31 +142,24 @@ class MMVT_spherical_CV(MMVT_collective_variable):
         This string will be put into a NAMD colvar file for tracking
         MMVT bounces.
         """
-        serial_group1 = [str(index+1) for index in self.group1]
-        serial_group2 = [str(index+1) for index in self.group2]
-        serial_group1_str = " ".join(serial_group1)
-        serial_group2_str = " ".join(serial_group2)
-        namd_colvar_string = """
-colvar {{
-  name collective_variable_{0}
-  outputappliedforce         off
-  distance {{
-    group1 {{ atomNumbers {1} }}
-    group2 {{ atomNumbers {2} }}
-  }}
-}}
-""".format(self.index, serial_group1_str, serial_group2_str)
+        # The groups don't change once the CV is made, so the string is
+        # only built the first time it is requested.
+        namd_colvar_string = getattr(self, "_namd_colvar_string", None)
+        if namd_colvar_string is not None:
+            return namd_colvar_string
+        serial_group1_str = " ".join(str(index+1) for index in self.group1)
+        serial_group2_str = " ".join(str(index+1) for index in self.group2)
+        namd_colvar_string = NAMD_COLVAR_TEMPLATE % (
+            self.index, serial_group1_str, serial_group2_str)
+        self._namd_colvar_string = namd_colvar_string
         return namd_colvar_string
     
     def add_groups(self, force):
         """
         
         """
-        self._mygroup_list = []
-        mygroup1 = force.addGroup(self.group1)
-        self._mygroup_list.append(mygroup1)
-        mygroup2 = force.addGroup(self.group2)
-        self._mygroup_list.append(mygroup2)
+        self._mygroup_list = [force.addGroup(self.group1),
+                              force.addGroup(self.group2)]
         return
     
     def add_parameters(self, force):
@@ -213,13 +216,11 @@ colvar {{
         so they can be provided to the custom force object.
         """
         assert milestone.cv_index == self.index
-        values_list = []
-        bitcode = 2**(milestone.alias_index-1)
-        k = milestone.variables["k"] * unit.kilojoules_per_mole/unit.angstrom**2
-        radius = milestone.variables["radius"] * unit.nanometers
-        values_list.append(bitcode)
-        values_list.append(k)
-        values_list.append(radius)
+        variables = milestone.variables
+        bitcode = mmvt_cv_base.get_bitcode(milestone.alias_index)
+        k = variables["k"] * mmvt_cv_base.K_UNIT
+        radius = variables["radius"] * mmvt_cv_base.VALUE_UNIT
+        values_list = [bitcode, k, radius]
         return values_list
     
     def get_namd_evaluation_string(self, milestone, cv_val_var="cv_val"):
@@ -231,20 +232,53 @@ colvar {{
         """
         assert milestone.cv_index == self.index
         k = milestone.variables["k"]
-        radius_in_nm = milestone.variables["radius"] * unit.nanometers
-        radius_in_A = radius_in_nm.value_in_unit(unit.angstroms)
-        eval_string = "{0} * (${1}_{2} - {3}) > 0".format(
+        radius_in_A = milestone.variables["radius"] * NM_TO_ANGSTROMS
+        eval_string = NAMD_EVALUATION_TEMPLATE % (
             k, cv_val_var, self.index, radius_in_A)
         return eval_string
     
+    def _get_group_indices(self):
+        """
+        Return the two atom groups as cached int32 index arrays. The
+        groups themselves stay lists so that they serialize as before.
+        """
+        # Deserialized CVs are created without calling __init__
+        group_indices = getattr(self, "_group_indices", None)
+        if group_indices is None:
+            group_indices = (np.asarray(self.group1, dtype=np.int32),
+                             np.asarray(self.group2, dtype=np.int32))
+            self._group_indices = group_indices
+        return group_indices
+    
+    def _get_com_arrays(self, traj):
+        """
+        Return the center of mass arrays of group1 and group2 for every
+        frame of traj.
+        """
+        group1_indices, group2_indices = self._get_group_indices()
+        com1_array = mmvt_cv_base.traj_group_center_of_mass(
+            traj, group1_indices)
+        com2_array = mmvt_cv_base.traj_group_center_of_mass(
+            traj, group2_indices)
+        return com1_array, com2_array
+    
+    def _get_distance_buffers(self, n_frames):
+        """
+        Return work buffers for the per-frame COM differences and radii,
+        which are only reallocated when the number of frames changes.
+        """
+        # Deserialized CVs are created without calling __init__
+        radii_buf = getattr(self, "_radii_buf", None)
+        if radii_buf is None or radii_buf.shape[0] != n_frames:
+            self._diff_buf = np.empty((n_frames, 3))
+            self._radii_buf = np.empty(n_frames)
+        return self._diff_buf, self._radii_buf
+    
     def get_mdtraj_cv_value(self, traj, frame_index):
         """
         Determine the current CV value for an mdtraj object.
         """
-        traj1 = traj.atom_slice(self.group1)
-        traj2 = traj.atom_slice(self.group2)
-        com1_array = mmvt_cv_base.traj_center_of_mass(traj1)
-        com2_array = mmvt_cv_base.traj_center_of_mass(traj2)
+        com1_array, com2_array = self._get_com_arrays(traj)
         
         #if traj1.xyz.shape[1] == 1:
         #    com1_array = traj1.xyz
@@ -256,11 +290,19 @@ colvar {{
         #else:
         #    com2_array = mdtraj.compute_center_of_mass(traj2)
             
-        com1 = com1_array[frame_index,:]
-        com2 = com2_array[frame_index,:]
-        radius = np.linalg.norm(com2-com1)
+        dx, dy, dz = com2_array[frame_index,:] - com1_array[frame_index,:]
+        radius = math.sqrt(dx*dx + dy*dy + dz*dz)
         return radius
     
+    def get_mdtraj_cv_values(self, traj):
+        """
+        Determine the CV value for every frame of an mdtraj object.
+        """
+        com1_array, com2_array = self._get_com_arrays(traj)
+        radii = mmvt_cv_base.com_distance_residuals(
+            com1_array, com2_array, 0.0)
+        return radii
+    
     def check_mdtraj_within_boundary(self, traj, milestone_variables, 
                                      verbose=False, TOL=0.001):
         """
@@ -268,12 +310,15 @@ colvar {{
         within the expected anchor. Return True if passed, return
         False if failed.
         """
-        for frame_index in range(traj.n_frames):
-            radius = self.get_mdtraj_cv_value(traj, frame_index)
-            result = self.check_value_within_boundary(
-                radius, milestone_variables, verbose, tolerance=TOL)
-            if not result:
-                return False
+        radii = self.get_mdtraj_cv_values(traj)
+        first_outside = mmvt_cv_base.first_frame_outside_boundary(
+            radii, milestone_variables["k"], milestone_variables["radius"],
+            TOL)
+        if first_outside is not None:
+            # Report the first frame that falls outside the boundary
+            return self.check_value_within_boundary(
+                radii[first_outside], milestone_variables, verbose,
+                tolerance=TOL)
             
         return True
         
@@ -292,7 +337,8 @@ colvar {{
             system, positions, self.group1)
         com2 = base.get_openmm_center_of_mass_com(
             system, positions, self.group2)
-        radius = np.linalg.norm(com2-com1)
+        dx, dy, dz = (com2-com1).value_in_unit(openmm.unit.nanometer)
+        radius = math.sqrt(dx*dx + dy*dy + dz*dz)
         return radius
         
     def check_openmm_context_within_boundary(
@@ -332,11 +378,7 @@ boundary at {:.4f} nm.""".format(radius, milestone_radius)
         to the MMVT boundary. Return True if passed, return False if 
         failed.
         """
-        traj1 = traj.atom_slice(self.group1)
-        traj2 = traj.atom_slice(self.group2)
-        
-        com1_array = mmvt_cv_base.traj_center_of_mass(traj1)
-        com2_array = mmvt_cv_base.traj_center_of_mass(traj2)
+        com1_array, com2_array = self._get_com_arrays(traj)
         #if traj1.xyz.shape[1] == 1:
         #    com1_array = traj1.xyz
         #else:
@@ -347,17 +389,17 @@ boundary at {:.4f} nm.""".format(radius, milestone_radius)
         #else:
         #    com2_array = mdtraj.compute_center_of_mass(traj2)
         
-        distances = []
-        for frame_index in range(traj.n_frames):
-            com1 = com1_array[frame_index,:]
-            com2 = com2_array[frame_index,:]
-            radius = np.linalg.norm(com2-com1)
-            milestone_radius = milestone_variables["radius"]
-            distances.append(radius - milestone_radius)
-            
-        assert np.isfinite(distances).all(), "Non-finite numbers detected in \
-            'distances'."
+        # The distances don't outlive this method, so they can be held in
+        # the CV's reusable buffers
+        diff_buf, radii_buf = self._get_distance_buffers(traj.n_frames)
+        distances = mmvt_cv_base.com_distance_residuals(
+            com1_array, com2_array, milestone_variables["radius"],
+            diff_out=diff_buf, out=radii_buf)
         avg_distance = np.mean(distances)
+        # Any NaN or infinite distance makes the mean non-finite, so the
+        # distances don't need a separate pass of their own
+        assert math.isfinite(avg_distance), "Non-finite numbers detected in \
+            'distances'."
         std_distance = np.std(distances)
         if abs(avg_distance) > max_avg or std_distance > max_std:
             if verbose:
@@ -7,16 +7,22 @@ import numpy as np
 
 from parmed import unit
 
+try:
+    import openmm
+except ImportError:
+    import simtk.openmm as openmm
+
 import seekr2.modules.common_base as base
 import seekr2.modules.mmvt_cvs.mmvt_cv_base as mmvt_cv_base
 from seekr2.modules.mmvt_cvs.mmvt_cv_base import MMVT_collective_variable
 
-class MMVT_tiwary_CV(MMVT_collective_variable):
+
+class MMVT_tiwary_CV(MMVT_collective_variable, blacklist=["_group_indices"]):
     """
     A Tiwary collective variable which is a linear function of order
     parameters.
     
-    """+MMVT_collective_variable.__doc__
+    """
     
     def __init__(self, index, order_parameters, order_parameter_weights):
         self.index = index
@@ -32,6 +38,7 @@ class MMVT_tiwary_CV(MMVT_collective_variable):
         self.assign_expressions_and_variables()
         self._mygroup_list = None
         self.variable_name = "v"
+        self._group_indices = None
         return
 
     def __name__(self):
@@ -75,11 +82,6 @@ class MMVT_tiwary_CV(MMVT_collective_variable):
         refer to them as forces outside of this layer of the code,
         preferring instead the term: boundary definitions.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         assert self.num_groups > 1
         expression_w_bitcode = "bitcode*"+self.openmm_expression
         return openmm.CustomCentroidBondForce(
@@ -90,20 +92,11 @@ class MMVT_tiwary_CV(MMVT_collective_variable):
         Create an OpenMM force object that will restrain the system to
         a given value of this CV.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-        
         assert self.num_groups > 1
         return openmm.CustomCentroidBondForce(
             self.num_groups, self.restraining_expression)
     
     def make_cv_force(self, alias_id):
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
         return openmm.CustomCentroidBondForce(
             self.num_groups, self.cv_expression)
     
@@ -111,11 +104,6 @@ class MMVT_tiwary_CV(MMVT_collective_variable):
         """
         
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         # Handle me force
         me_expr = "(me_val - {})^2".format(self.cv_expression)
         me_force = openmm.CustomCentroidBondForce(
@@ -187,12 +175,11 @@ class MMVT_tiwary_CV(MMVT_collective_variable):
         """
         
         """
-        self._mygroup_list = []
-        for order_parameter in self.order_parameters:
-            for i in range(order_parameter.get_num_groups()):
-                group = order_parameter.get_group(i)
-                mygroup = force.addGroup(group)
-                self._mygroup_list.append(mygroup)
+        add_group = force.addGroup
+        self._mygroup_list = [
+            add_group(order_parameter.get_group(i)) \
+            for order_parameter in self.order_parameters \
+            for i in range(order_parameter.get_num_groups())]
         return
     
     def add_parameters(self, force):
@@ -242,15 +229,15 @@ class MMVT_tiwary_CV(MMVT_collective_variable):
         so they can be provided to the custom force object.
         """
         assert milestone.cv_index == self.index
-        values_list = []
-        bitcode = 2**(milestone.alias_index-1)
-        k = milestone.variables['k'] * unit.kilojoules_per_mole/unit.angstrom**2
-        radius = milestone.variables['value'] * unit.nanometers
-        values_list.append(bitcode)
-        for i, order_parameter in enumerate(self.order_parameters):
-            key = "c{}".format(i)
-            c = milestone.variables[key]
-            values_list.append(c)
+        variables = milestone.variables
+        bitcode = mmvt_cv_base.get_bitcode(milestone.alias_index)
+        k = variables['k'] * mmvt_cv_base.K_UNIT
+        radius = variables['value'] * mmvt_cv_base.VALUE_UNIT
+        # The weight variable names c0, c1, ... are the leading per-dof
+        # variables made in assign_expressions_and_variables()
+        weight_keys = self.per_dof_variables[:len(self.order_parameters)]
+        values_list = [bitcode]
+        values_list.extend(variables[key] for key in weight_keys)
         values_list.append(k)
         values_list.append(radius)
         return values_list
@@ -264,32 +251,52 @@ class MMVT_tiwary_CV(MMVT_collective_variable):
         """
         raise Exception("MMVT Tiwary CVs are not available in NAMD")
     
+    def _get_group_indices(self):
+        """
+        Return, for each order parameter, its atom groups as cached
+        int32 index arrays. The groups themselves stay lists so that
+        they serialize as before.
+        """
+        # Deserialized CVs are created without calling __init__
+        group_indices = getattr(self, "_group_indices", None)
+        if group_indices is None:
+            group_indices = [
+                [np.asarray(order_parameter.get_group(j), dtype=np.int32) \
+                 for j in range(order_parameter.get_num_groups())] \
+                for order_parameter in self.order_parameters]
+            self._group_indices = group_indices
+        return group_indices
+    
     def get_mdtraj_cv_value(self, traj, frame_index):
         """
         Determine the current CV value for an mdtraj object.
         """
-        op_com_array_list = []
-        for order_parameter in self.order_parameters:
-            com_array_list = []
-            for j in range(order_parameter.get_num_groups()):
-                group = order_parameter.get_group(j)
-                traj_group = traj.atom_slice(group)
-                #com_array = mdtraj.compute_center_of_mass(traj_group)
-                com_array = mmvt_cv_base.traj_center_of_mass(traj_group)
-                com_array_list.append(com_array)
-            op_com_array_list.append(com_array_list)
-                
         op_value = 0.0
-        for i, order_parameter in enumerate(self.order_parameters):
-            com_list = []
-            for j in range(order_parameter.get_num_groups()):
-                com = op_com_array_list[i][j][frame_index,:]
-                com_list.append(com)
-            op_term = order_parameter.get_value(com_list)
-            op_weight = self.order_parameter_weights[i]
+        for order_parameter, op_weight, op_groups in zip(
+                self.order_parameters, self.order_parameter_weights,
+                self._get_group_indices()):
+            # An (n_groups, 3) array of this frame's centers of mass
+            coms = np.array([mmvt_cv_base.traj_group_center_of_mass(
+                traj, group)[frame_index,:] for group in op_groups])
+            op_term = order_parameter.get_value(coms)
             op_value += op_weight * op_term
         return op_value
     
+    def get_mdtraj_cv_values(self, traj):
+        """
+        Determine the CV value for every frame of an mdtraj object. The
+        centers of mass are only computed once for the whole trajectory,
+        and each order parameter is evaluated over all frames at once.
+        """
+        # An (n_order_parameters, n_frames) array of order parameter values
+        op_values = np.stack([order_parameter.get_value_array(
+            np.stack([mmvt_cv_base.traj_group_center_of_mass(traj, group) \
+                      for group in op_groups])) \
+            for order_parameter, op_groups in zip(
+                self.order_parameters, self._get_group_indices())])
+        weights = np.asarray(self.order_parameter_weights, dtype=np.float64)
+        return weights @ op_values
+    
     def check_mdtraj_within_boundary(self, traj, milestone_variables, 
                                      verbose=False, TOL=0.001):
         """
@@ -297,12 +304,15 @@ class MMVT_tiwary_CV(MMVT_collective_variable):
         within the expected anchor. Return True if passed, return
         False if failed.
         """
-        for frame_index in range(traj.n_frames):
-            op_value = self.get_mdtraj_cv_value(traj, frame_index)
-            result = self.check_value_within_boundary(
-                op_value, milestone_variables, verbose=verbose, tolerance=TOL)
-            if not result:
-                return False
+        op_values = self.get_mdtraj_cv_values(traj)
+        first_outside = mmvt_cv_base.first_frame_outside_boundary(
+            op_values, milestone_variables["k"], milestone_variables["value"],
+            TOL)
+        if first_outside is not None:
+            # Report the first frame that falls outside the boundary
+            return self.check_value_within_boundary(
+                op_values[first_outside], milestone_variables,
+                verbose=verbose, tolerance=TOL)
             
         return True
     
@@ -315,24 +325,15 @@ class MMVT_tiwary_CV(MMVT_collective_variable):
         if positions is None:
             state = context.getState(getPositions=True)
             positions = state.getPositions()
-        op_com_list = []
-        for order_parameter in self.order_parameters:
-            com_list = []
-            for j in range(order_parameter.get_num_groups()):
-                group = order_parameter.get_group(j)
-                com = base.get_openmm_center_of_mass_com(
-                    system, positions, group)
-                com_list.append(com)
-            op_com_list.append(com_list)
-                
         op_value = 0.0
-        for i, order_parameter in enumerate(self.order_parameters):
-            com_list = []
-            for j in range(order_parameter.get_num_groups()):
-                com = op_com_list[i][j]
-                com_list.append(com.value_in_unit(unit.nanometer))
-            op_term = order_parameter.get_value(com_list)
-            op_weight = self.order_parameter_weights[i]
+        for order_parameter, op_weight in zip(
+                self.order_parameters, self.order_parameter_weights):
+            # An (n_groups, 3) array of the centers of mass, in nm
+            coms = np.array([base.get_openmm_center_of_mass_com(
+                system, positions, order_parameter.get_group(j))\
+                    .value_in_unit(unit.nanometer) \
+                for j in range(order_parameter.get_num_groups())])
+            op_term = order_parameter.get_value(coms)
             op_value += op_weight * op_term
         return op_value
     
@@ -4,7 +4,10 @@ Structures, methods, and functions for handling Voronoi CVs.
 
 import numpy as np
 
-from parmed import unit
+try:
+    import openmm
+except ImportError:
+    import simtk.openmm as openmm
 
 import seekr2.modules.common_base as base
 import seekr2.modules.common_cv as common_cv
@@ -23,7 +26,7 @@ class MMVT_Voronoi_CV(MMVT_collective_variable):
     A Voronoi collective variable which contains multidimensional functions
     to produce a Voronoi Tesselation.
     
-    """+MMVT_collective_variable.__doc__
+    """
     
     def __init__(self, index):
         self.index = index
@@ -74,11 +77,6 @@ class MMVT_Voronoi_CV(MMVT_collective_variable):
         refer to them as forces outside of this layer of the code,
         preferring instead the term: boundary definitions.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-        
         cv_expression = self.make_cv_expr(alias_id)
         self.openmm_expression = "step(" + cv_expression + ")"
         expression_w_bitcode = "bitcode_{}*".format(alias_id)+self.openmm_expression
@@ -89,11 +87,6 @@ class MMVT_Voronoi_CV(MMVT_collective_variable):
         Create an OpenMM force object that will restrain the system to
         a given value of this CV.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-        
         cv_expression = self.make_cv_expr(alias_id)
         self.restraining_expression = "0.5*k_{}*(".format(alias_id) + cv_expression + ")^2"
         
@@ -157,8 +150,8 @@ class MMVT_Voronoi_CV(MMVT_collective_variable):
         """
         assert milestone.cv_index == self.index
         values_list = []
-        bitcode = 2**(milestone.alias_index-1)
-        k = milestone.variables["k"] * unit.kilojoules_per_mole/unit.angstrom**2
+        bitcode = mmvt_cv_base.get_bitcode(milestone.alias_index)
+        k = milestone.variables["k"] * mmvt_cv_base.K_UNIT
         values_list.append(bitcode)
         values_list.append(k)
         for i, child_cv in enumerate(self.child_cvs):
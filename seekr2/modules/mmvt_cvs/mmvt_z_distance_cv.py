@@ -4,10 +4,17 @@ Structures, methods, and functions for handling Z-distance CVs.
 groups) - usable for membrane/binding or membrane/permeant systems.
 """
 
+import math
+
 import numpy as np
 
 from parmed import unit
 
+try:
+    import openmm
+except ImportError:
+    import simtk.openmm as openmm
+
 import seekr2.modules.common_base as base
 import seekr2.modules.mmvt_cvs.mmvt_cv_base as mmvt_cv_base
 from seekr2.modules.mmvt_cvs.mmvt_cv_base import MMVT_collective_variable
@@ -17,7 +24,7 @@ class MMVT_z_distance_CV(MMVT_collective_variable):
     A z-distance collective variable represents the difference in z
     coordinate between two different groups of atoms.
     
-    """+MMVT_collective_variable.__doc__
+    """
     
     def __init__(self, index, groups):
         self.index = index
@@ -52,11 +59,6 @@ class MMVT_z_distance_CV(MMVT_collective_variable):
         refer to them as forces outside of this layer of the code,
         preferring instead the term: boundary definitions.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         assert self.num_groups == 2
         expression_w_bitcode = "bitcode*"+self.openmm_expression
         return openmm.CustomCentroidBondForce(
@@ -67,11 +69,6 @@ class MMVT_z_distance_CV(MMVT_collective_variable):
         Create an OpenMM force object that will restrain the system to
         a given value of this CV.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         assert self.num_groups == 2
         return openmm.CustomCentroidBondForce(
             self.num_groups, self.restraining_expression)
@@ -81,11 +78,6 @@ class MMVT_z_distance_CV(MMVT_collective_variable):
         Make a force that is composed only of the cv_expression.
         Used for metadynamics and potentially other things.
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         assert self.num_groups == 2
         return openmm.CustomCentroidBondForce(
             self.num_groups, self.cv_expression)
@@ -94,11 +86,6 @@ class MMVT_z_distance_CV(MMVT_collective_variable):
         """
         
         """
-        try:
-            import openmm
-        except ImportError:
-            import simtk.openmm as openmm
-            
         me_expr = "(me_val - {})^2".format(self.cv_expression)
         me_force = openmm.CustomCentroidBondForce(
             self.num_groups, me_expr)
@@ -201,9 +188,9 @@ class MMVT_z_distance_CV(MMVT_collective_variable):
         """
         assert milestone.cv_index == self.index
         values_list = []
-        bitcode = 2**(milestone.alias_index-1)
-        k = milestone.variables["k"] * unit.kilojoules_per_mole/unit.angstrom**2
-        value = milestone.variables["value"] * unit.nanometers
+        bitcode = mmvt_cv_base.get_bitcode(milestone.alias_index)
+        k = milestone.variables["k"] * mmvt_cv_base.K_UNIT
+        value = milestone.variables["value"] * mmvt_cv_base.VALUE_UNIT
         values_list.append(bitcode)
         values_list.append(k)
         values_list.append(value)
@@ -222,15 +209,22 @@ class MMVT_z_distance_CV(MMVT_collective_variable):
         """
         Determine the current CV value for an mdtraj object.
         """
-        traj1 = traj.atom_slice(self.group1)
-        traj2 = traj.atom_slice(self.group2)
-        com1_array = mmvt_cv_base.traj_center_of_mass(traj1)
-        com2_array = mmvt_cv_base.traj_center_of_mass(traj2)
+        com1_array = mmvt_cv_base.traj_group_center_of_mass(traj, self.group1)
+        com2_array = mmvt_cv_base.traj_group_center_of_mass(traj, self.group2)
         com1 = com1_array[frame_index,:]
         com2 = com2_array[frame_index,:]
         value = com2[2] - com1[2]
         return value
     
+    def get_mdtraj_cv_values(self, traj):
+        """
+        Determine the CV value for every frame of an mdtraj object at
+        once, instead of one frame at a time.
+        """
+        com1_array = mmvt_cv_base.traj_group_center_of_mass(traj, self.group1)
+        com2_array = mmvt_cv_base.traj_group_center_of_mass(traj, self.group2)
+        return com2_array[:,2] - com1_array[:,2]
+    
     def check_mdtraj_within_boundary(self, traj, milestone_variables, 
                                      verbose=False, TOL=0.001):
         """
@@ -238,12 +232,15 @@ class MMVT_z_distance_CV(MMVT_collective_variable):
         within the expected anchor. Return True if passed, return
         False if failed.
         """
-        for frame_index in range(traj.n_frames):
-            value = self.get_mdtraj_cv_value(traj, frame_index)
-            result = self.check_value_within_boundary(
-                value, milestone_variables, verbose, tolerance=TOL)
-            if not result:
-                return False
+        values = self.get_mdtraj_cv_values(traj)
+        first_outside = mmvt_cv_base.first_frame_outside_boundary(
+            values, milestone_variables["k"], milestone_variables["value"],
+            TOL)
+        if first_outside is not None:
+            # Report the first frame that falls outside the boundary
+            return self.check_value_within_boundary(
+                values[first_outside], milestone_variables, verbose,
+                tolerance=TOL)
             
         return True
         
@@ -302,22 +299,13 @@ boundary at {:.4f} nm.""".format(value, milestone_value)
         to the MMVT boundary. Return True if passed, return False if 
         failed.
         """
-        traj1 = traj.atom_slice(self.group1)
-        traj2 = traj.atom_slice(self.group2)
-        
-        com1_array = mmvt_cv_base.traj_center_of_mass(traj1)
-        com2_array = mmvt_cv_base.traj_center_of_mass(traj2)
-        distances = []
-        for frame_index in range(traj.n_frames):
-            com1 = com1_array[frame_index,:]
-            com2 = com2_array[frame_index,:]
-            value = com2[2] - com1[2]
-            milestone_value = milestone_variables["value"]
-            distances.append(value - milestone_value)
-            
-        assert np.isfinite(distances).all(), "Non-finite numbers detected in \
-            'distances'."
+        distances = self.get_mdtraj_cv_values(traj) \
+            - milestone_variables["value"]
         avg_distance = np.mean(distances)
+        # Any NaN or infinite distance makes the mean non-finite, so the
+        # distances don't need a separate pass of their own
+        assert math.isfinite(avg_distance), "Non-finite numbers detected in \
+            'distances'."
         std_distance = np.std(distances)
         if abs(avg_distance) > max_avg or std_distance > max_std:
             if verbose:
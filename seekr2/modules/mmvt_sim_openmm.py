@@ -122,22 +122,32 @@ def add_forces(sim_openmm, model, anchor, box_vectors):
     """
     curdir = os.getcwd()
     os.chdir(model.anchor_rootdir)
+    # Milestones of an anchor often share a CV; its nonbonded information
+    # (which scans every exception of the system) only needs assigning
+    # once.
+    prepared_cv_indices = set()
     for milestone in anchor.milestones:
         cv = milestone.get_CV(model)
-        if isinstance(cv, mmvt_closest_pair_cv.MMVT_closest_pair_CV) \
-                or isinstance(cv, mmvt_count_contacts_cv.MMVT_count_contacts_CV):
-            assign_nonbonded_cv_info(cv, sim_openmm.system, box_vectors)
-            
-        elif isinstance(cv, mmvt_voronoi_cv.MMVT_Voronoi_CV):
-            for child_cv in cv.child_cvs:
-                if isinstance(child_cv, mmvt_closest_pair_cv.MMVT_closest_pair_CV) \
-                        or isinstance(child_cv, mmvt_count_contacts_cv.MMVT_count_contacts_CV):
-                    assign_nonbonded_cv_info(child_cv, sim_openmm.system, 
-                                             box_vectors)
-                #myforce = make_mmvt_boundary_definitions(
-                #    child_cv, milestone)
-                #forcenum = sim_openmm.system.addForce(myforce)
+        if cv.index not in prepared_cv_indices:
+            prepared_cv_indices.add(cv.index)
+            if isinstance(cv, mmvt_closest_pair_cv.MMVT_closest_pair_CV) \
+                    or isinstance(cv, mmvt_count_contacts_cv.MMVT_count_contacts_CV):
+                assign_nonbonded_cv_info(cv, sim_openmm.system, box_vectors)
+                
+            elif isinstance(cv, mmvt_voronoi_cv.MMVT_Voronoi_CV):
+                for child_cv in cv.child_cvs:
+                    if isinstance(child_cv, mmvt_closest_pair_cv.MMVT_closest_pair_CV) \
+                            or isinstance(child_cv, mmvt_count_contacts_cv.MMVT_count_contacts_CV):
+                        assign_nonbonded_cv_info(child_cv, sim_openmm.system, 
+                                                 box_vectors)
+                    #myforce = make_mmvt_boundary_definitions(
+                    #    child_cv, milestone)
+                    #forcenum = sim_openmm.system.addForce(myforce)
         
+        # Each milestone gets its own boundary force, rather than sharing
+        # one force (with a bond per milestone) among all milestones of a
+        # CV. The CVs' update_groups_and_variables() methods and the
+        # "cannot be called twice" checks assume one bond per force.
         myforce = make_mmvt_boundary_definitions(
             cv, milestone)
         forcenum = sim_openmm.system.addForce(myforce)
@@ -147,7 +157,7 @@ def add_forces(sim_openmm, model, anchor, box_vectors):
     return
 
 def add_simulation(sim_openmm, model, topology, positions, box_vectors,
-                   load_state_file=None):
+                   load_state_file=None, restart=False):
     """
     Assign the OpenMM simulation object for MMVT.
     """
@@ -163,14 +173,17 @@ def add_simulation(sim_openmm, model, topology, positions, box_vectors,
         sim_openmm.simulation.loadState(load_state_file)
         state = sim_openmm.simulation.context.getState(getPositions=True)
         positions = state.getPositions(positions)
-    elif positions is not None:
+    elif positions is not None and not restart:
+        # A restart loads its velocities from the checkpoint
         sim_openmm.simulation.context.setVelocitiesToTemperature(
             model.openmm_settings.initial_temperature * unit.kelvin)
         
     if box_vectors is not None:
         sim_openmm.simulation.context.setPeriodicBoxVectors(
             *box_vectors.to_quantity())
-    if model.openmm_settings.run_minimization:
+    if model.openmm_settings.run_minimization and not restart:
+        # A restart continues from the checkpointed state, which was
+        # already minimized before the original run
         assert positions is not None, "If states are being loaded as starting"\
             "positions, minimizations cannot be activated."
         print("Warning: running minimizations. It is recommended that "\
@@ -183,7 +196,8 @@ def add_simulation(sim_openmm, model, topology, positions, box_vectors,
     return positions
 
 def create_sim_openmm(model, anchor, output_filename, state_prefix=None, 
-                      frame=0, load_state_file=None, use_only_reference=False):
+                      frame=0, load_state_file=None, use_only_reference=False,
+                      restart=False):
     """
     Take all relevant model and anchor information and generate
     the necessary OpenMM objects to run the simulation.
@@ -210,6 +224,12 @@ def create_sim_openmm(model, anchor, output_filename, state_prefix=None,
     frame : int
         Which frame of the starting positions file to retrieve.
     
+    restart : bool, default False
+        Whether the simulation is about to be restarted from a
+        checkpoint. If so, initial velocities are not assigned and
+        no minimization is run, since the checkpoint replaces the
+        state anyway.
+    
     Returns
     -------
     sim_openmm : Sim_openmm()
@@ -228,7 +248,8 @@ def create_sim_openmm(model, anchor, output_filename, state_prefix=None,
     common_sim_openmm.add_platform(sim_openmm, model, use_only_reference)
     add_forces(sim_openmm, model, anchor, box_vectors)
     positions = add_simulation(
-        sim_openmm, model, topology, positions, box_vectors, load_state_file)
+        sim_openmm, model, topology, positions, box_vectors, load_state_file,
+        restart)
     if anchor.__class__.__name__ == "MMVT_toy_anchor":
         out_file_name = os.path.join(model.anchor_rootdir, anchor.directory, 
                                      anchor.building_directory, "toy.pdb")
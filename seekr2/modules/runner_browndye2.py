@@ -8,6 +8,8 @@ import os
 import re
 import argparse
 import glob
+import fnmatch
+import subprocess
 
 import seekr2.modules.common_base as base
 import seekr2.modules.common_sim_browndye2 as sim_browndye2
@@ -55,24 +57,23 @@ def cleanse_bd_outputs(directory, check_mode=True):
         present, will return True, will return False otherwise.
     """
     files_will_be_removed = False
-    output_files_glob = os.path.join(directory, base.BROWNDYE_OUTPUT)
-    output_files_list = glob.glob(output_files_glob)
-    for output_file in output_files_list:
-        files_will_be_removed = True
-        if not check_mode:
-            os.remove(output_file)
+    if not os.path.isdir(directory):
+        return files_will_be_removed
     
-    simulation_file_glob = os.path.join(directory, "*_simulation.xml")
-    for simulation_file in glob.glob(simulation_file_glob):
-        files_will_be_removed = True
-        if not check_mode:
-            os.remove(simulation_file)
-    
-    traj_file_glob = os.path.join(directory, "traj*.xml")
-    for traj_file in glob.glob(traj_file_glob):
-        files_will_be_removed = True
-        if not check_mode:
-            os.remove(traj_file)
+    output_file_patterns = [base.BROWNDYE_OUTPUT, "*_simulation.xml", 
+                            "traj*.xml"]
+    # A single pass over the directory instead of one glob per pattern
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            # Like glob, don't let wildcards match hidden files
+            if entry.name.startswith("."):
+                continue
+            for pattern in output_file_patterns:
+                if fnmatch.fnmatch(entry.name, pattern):
+                    files_will_be_removed = True
+                    if not check_mode:
+                        os.remove(entry.path)
+                    break
     return files_will_be_removed
 
 def make_browndye_input_xml(model, rootdir, receptor_xml_filename, 
@@ -321,10 +322,18 @@ def run_bd_top(browndye_bin_dir, bd_directory, restart=False,
         "Necessary file doesn't exist: %s" % \
         sim_browndye2.BROWNDYE_INPUT_FILENAME
     print("running command:", command)
-    os.system(command)
-    assert os.path.exists(simulation_filename), "Problem occurred running "\
-        "bd_top: simulation file %s was not generated." % simulation_filename
-    os.chdir(curdir)
+    try:
+        # Launch the binary directly rather than through a shell (which
+        # would otherwise have expanded a '~' in browndye_bin_dir)
+        subprocess.run([os.path.expanduser(bd_command), 
+                        sim_browndye2.BROWNDYE_INPUT_FILENAME])
+        assert os.path.exists(simulation_filename), "Problem occurred "\
+            "running bd_top: simulation file %s was not generated." \
+            % simulation_filename
+    finally:
+        # Don't leave the process in the BD directory if bd_top is
+        # missing or failed
+        os.chdir(curdir)
     return
 
 def modify_variables(bd_milestone_directory, bd_output_glob, 
@@ -485,11 +494,17 @@ def run_nam_simulation(browndye_bin_dir, bd_directory, bd_output_glob):
         + sim_browndye2.BROWNDYE_LIGAND + "_simulation.xml"
     command = bd_command + " " + simulation_filename
     print("running command:", command)
-    os.system(command)
-    results_glob = glob.glob(bd_output_glob)
-    assert len(results_glob) > 0, "Problem occurred running "\
-        "nam_simulation: results file was not generated."
-    os.chdir(curdir)
+    try:
+        subprocess.run([os.path.expanduser(bd_command), simulation_filename])
+        # Only the existence of a results file matters here, so stop at
+        # the first match instead of listing all of them
+        first_results_file = next(glob.iglob(bd_output_glob), None)
+        assert first_results_file is not None, "Problem occurred running "\
+            "nam_simulation: results file was not generated."
+    finally:
+        # Don't leave the process in the BD directory if nam_simulation
+        # is missing or failed
+        os.chdir(curdir)
     return
 
 if __name__ == "__main__":
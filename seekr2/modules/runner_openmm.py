@@ -967,7 +967,7 @@ if __name__ == "__main__":
     if model.get_type() == "mmvt":
         sim_openmm_obj = mmvt_sim_openmm.create_sim_openmm(
             model, myanchor, output_file, state_file_prefix, frame=0, 
-            load_state_file=load_state_file)
+            load_state_file=load_state_file, restart=restart)
     elif model.get_type() == "elber":
         sim_openmm_factory = elber_sim_openmm.create_sim_openmm(
             model, myanchor, output_file, state_file_prefix)
@@ -152,7 +152,7 @@ def get_current_step_openmm(model, anchor, load_state_file_list=None,
             
             sim_openmm_obj = mmvt_sim_openmm.create_sim_openmm(
                 model, anchor, dummy_file.name, frame=frame, 
-                load_state_file=load_state_file_instance)
+                load_state_file=load_state_file_instance, restart=True)
             simulation = sim_openmm_obj.simulation
         elif model.get_type() == "elber":
             sim_openmm_obj = elber_sim_openmm.create_sim_openmm(
@@ -509,7 +509,7 @@ def run_openmm(model, anchor_index, restart, total_simulation_length,
     if model.get_type() == "mmvt":
         sim_openmm_obj = mmvt_sim_openmm.create_sim_openmm(
             model, myanchor, default_output_file, state_file_prefix, frame, 
-            load_state_file)
+            load_state_file, restart=restart)
     elif model.get_type() == "elber":
         assert frame == 0, "Swarms not yet allowed in Elber simulations."
         sim_openmm_obj = elber_sim_openmm.create_sim_openmm(
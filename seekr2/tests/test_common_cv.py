@@ -4,6 +4,8 @@ test_common_cv.py
 Testing modules/common_cv.py
 """
 
+import numpy as np
+
 import seekr2.modules.common_cv as common_cv
 
 def test_assign_state_points_toy(toy_mmvt_model_input, toy_mmvt_model):
@@ -35,3 +37,20 @@ def test_assign_state_points_hostguest(host_guest_mmvt_model_input,
     assert host_guest_mmvt_model.anchors[13].name == "bulk"
     return
 
+def test_tiwary_order_parameter_get_value_array():
+    coms = np.array([[[0.0, 0.0, 0.0], [0.1, 0.2, 0.3]],
+                     [[1.0, 0.0, 0.0], [0.9, -0.4, 0.2]],
+                     [[1.0, 1.0, 0.0], [1.5, 0.6, -0.7]],
+                     [[1.0, 1.0, -1.0], [2.1, -0.3, 0.4]]])
+    order_parameters = [common_cv.Tiwary_cv_distance_order_parameter(),
+                        common_cv.Tiwary_cv_angle_order_parameter(),
+                        common_cv.Tiwary_cv_torsion_order_parameter()]
+    for order_parameter in order_parameters:
+        num_groups = order_parameter.get_num_groups()
+        values = order_parameter.get_value_array(coms[:num_groups])
+        assert values.shape == (2,)
+        for frame_index in range(2):
+            value = order_parameter.get_value(
+                list(coms[:num_groups,frame_index,:]))
+            assert np.isclose(values[frame_index], value)
+    return
@@ -7,6 +7,8 @@ try:
 except ImportError:
     import simtk.unit as unit
 
+import numpy as np
+
 import seekr2.modules.common_sim_openmm as common_sim_openmm
 import seekr2.modules.elber_cvs.elber_external_cv as elber_external_cv
 import seekr2.tests.create_toy_system as create_toy_system
@@ -43,4 +45,18 @@ def test_elber_external_boundary(tmp_path):
     toy_state = toy_simulation.context.getState(getEnergy=True, groups={1})
     boundary_val2 = toy_state.getPotentialEnergy()
     assert boundary_val2.value_in_unit(unit.kilojoules/unit.mole) == 1.0
-    
\ No newline at end of file
+    
+def test_check_positions_within_boundary_batched():
+    milestone_variables = {"k":1.0, "value":0.5}
+    my_cv = elber_external_cv.Elber_external_CV(index=0, groups=[[0],[1]])
+    my_cv.cv_expression = "step(k*(x1 - value)) - 0.5 + sqrt(y2^2)"
+    positions_batch = np.array([[[0.3, 0.0, 0.0], [0.1, 0.2, 0.0]],
+                                [[0.7, 0.0, 0.0], [0.1, 0.2, 0.0]],
+                                [[0.3, 0.0, 0.0], [0.1, 0.8, 0.0]]])
+    result = my_cv.check_positions_within_boundary_batched(
+        positions_batch, milestone_variables)
+    assert result.shape == (3,)
+    assert list(result) == [True, False, False]
+    for positions, expected in zip(positions_batch, result):
+        assert my_cv.check_value_within_boundary(
+            positions, milestone_variables) == expected
@@ -7,6 +7,7 @@ try:
 except ImportError:
     import simtk.unit as unit
 
+import seekr2.modules.common_base as base
 import seekr2.modules.common_sim_openmm as common_sim_openmm
 import seekr2.modules.elber_cvs.elber_spherical_cv as elber_spherical_cv
 import seekr2.tests.create_toy_system as create_toy_system
@@ -43,4 +44,14 @@ def test_elber_spherical_boundary(tmp_path):
     toy_state = toy_simulation.context.getState(getEnergy=True, groups={1})
     boundary_val2 = toy_state.getPotentialEnergy()
     assert boundary_val2.value_in_unit(unit.kilojoules/unit.mole) == 1.0
-    
\ No newline at end of file
+    
+
+def test_get_namd_fwd_rev_evaluation_string():
+    my_cv = elber_spherical_cv.Elber_spherical_CV(index=0, groups=[[0],[1]])
+    milestone = base.Milestone()
+    milestone.index = 2
+    milestone.cv_index = 0
+    milestone.variables = {"k":5.0, "radius":0.15}
+    eval_string = my_cv.get_namd_fwd_rev_evaluation_string(milestone)
+    assert eval_string == "5.0 * ($cv_val_0 - 1.5) > 0"
+    assert my_cv.get_namd_fwd_rev_evaluation_string(milestone) == eval_string
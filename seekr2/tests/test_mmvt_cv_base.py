@@ -7,6 +7,8 @@ import shutil
 
 import numpy as np
 
+import seekr2.modules.common_base as base
+import seekr2.modules.mmvt_cvs.mmvt_cv_base as mmvt_cv_base
 from seekr2.modules import mmvt_sim_openmm
 
 # TODO: move tests to appropriate test files and remove this test file
@@ -62,6 +64,29 @@ def test_MMVT_anchor_get_ids(host_guest_mmvt_model):
     assert anchor1.get_ids() == [0, 1]
     return
 
+def test_MMVT_anchor_milestone_maps_follow_milestones():
+    """
+    Test that the anchor's cached milestone lookups are kept up to date
+    when milestones are added, or are renumbered in place.
+    """
+    anchor = mmvt_cv_base.MMVT_anchor()
+    for i, neighbor_index in enumerate([0, 2]):
+        milestone = base.Milestone()
+        milestone.index = i
+        milestone.neighbor_anchor_index = neighbor_index
+        milestone.alias_index = i+1
+        anchor.milestones.append(milestone)
+        assert anchor.get_ids() == list(range(i+1))
+        assert anchor.alias_from_neighbor_id(neighbor_index) == i+1
+    
+    # Renumbering the milestones in place requires invalidating the cache
+    anchor.milestones[1].neighbor_anchor_index = 3
+    anchor._invalidate_milestone_maps()
+    assert anchor.alias_from_neighbor_id(2) is None
+    assert anchor.alias_from_neighbor_id(3) == 2
+    assert anchor.id_from_alias(2) == 1
+    return
+
 def test_check_openmm_context_within_boundary(host_guest_mmvt_model, tmp_path):
     """
     Test whether the check can find systems that exist outside the proper
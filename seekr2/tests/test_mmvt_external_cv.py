@@ -99,6 +99,30 @@ def test_mmvt_external_boundary(tmp_path):
     
     return
 
+def test_get_mdtraj_cv_values(tmp_path):
+    toy_system, toy_topology = create_toy_system.make_toy_system_and_topology(2)
+    my_cv = mmvt_external_cv.MMVT_external_CV(index=0, groups=[[0], [1]])
+    my_cv.cv_expression = "step(x1 - 0.5) + sqrt(y2^2)"
+    xyz = np.array([[[0.3, 0.0, 0.0], [0.1, 0.2, 0.0]],
+                    [[0.7, 0.0, 0.0], [0.1, 0.2, 0.0]],
+                    [[0.3, 0.0, 0.0], [0.1, 0.8, 0.0]]])
+    pdb_filename = os.path.join(tmp_path, "external_mmvt_toy.pdb")
+    common_sim_openmm.write_toy_pdb_file(toy_topology, xyz[0], pdb_filename)
+    traj = mdtraj.load(pdb_filename)
+    traj.xyz = xyz
+    values = my_cv.get_mdtraj_cv_values(traj)
+    assert values.shape == (3,)
+    for frame_index in range(traj.n_frames):
+        assert np.isclose(values[frame_index],
+                          my_cv.get_mdtraj_cv_value(traj, frame_index))
+    
+    milestone_variables = {"k":1.0, "value":0.9}
+    assert my_cv.check_mdtraj_within_boundary(
+        traj[[0]], milestone_variables, TOL=0.0)
+    assert not my_cv.check_mdtraj_within_boundary(
+        traj, milestone_variables, TOL=0.0)
+    return
+
 def test_mmvt_spherical_restraint(tmp_path):
     # Set initial variables
     milestone_variables1 = {"k":9000.0, "value":0.5}
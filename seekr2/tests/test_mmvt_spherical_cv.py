@@ -225,4 +225,28 @@ def test_mmvt_spherical_voronoi_boundary():
     assert np.isclose(boundary_val_neighbor.value_in_unit(unit.kilojoules/unit.mole), 0.04)
     
     return
-    
\ No newline at end of file
+    
+def test_mmvt_spherical_boundary_traj_modified_in_place():
+    """
+    Changing a trajectory's coordinates in place (as image_molecules()
+    does) must change the outcome of the boundary check.
+    """
+    milestone_variables = {"k":-1.0, "radius":0.3}
+    topology = mdtraj.Topology()
+    residue = topology.add_residue("RES", topology.add_chain())
+    for i in range(4):
+        topology.add_atom("C{}".format(i), mdtraj.element.carbon, residue)
+    xyz = np.array([[[-0.1, 0.0, 0.0], [0.2, 0.4, 0.0], 
+                     [0.1, 0.0, 0.0], [0.4, 0.4, 0.0]]])
+    traj = mdtraj.Trajectory(xyz, topology)
+    my_cv = mmvt_spherical_cv.MMVT_spherical_CV(
+        index=0, groups=[[0,2],[1,3]])
+    assert my_cv.check_mdtraj_within_boundary(
+        traj, milestone_variables, verbose=False, TOL=0.0)
+    
+    # Move the second group inside the radius, in the same trajectory
+    traj.xyz[0,1,:] = [0.0, 0.1, 0.0]
+    traj.xyz[0,3,:] = [0.2, 0.1, 0.0]
+    assert not my_cv.check_mdtraj_within_boundary(
+        traj, milestone_variables, verbose=False, TOL=0.0)
+    return